@@ -1,27 +1,167 @@
+import asyncio
+import threading
+
 import gradio as gr
-from src.model.model import SummarizerModel
-import torch
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from transformers import AutoTokenizer
+
+from src.app.scheduler import BatchScheduler
+from src.model.backends import export_dir_for
+from src.model.cache import SummaryCache
+from src.model.model import SummarizerModel, resolve_checkpoint
+from src.utils import metrics
 
 MODELS = {
     "CNN/DailyMail": "cnn_dailymail_epoch_5.pth",
     "XSum": "xsum_epoch_5.pth"
 }
 
+# Inference backend per model: "eager", "int8" or "onnx".
+MODEL_BACKENDS = {
+    "CNN/DailyMail": "eager",
+    "XSum": "eager"
+}
+
+# Accepted range per generation setting of a variants request.
+VARIANT_LIMITS = {"max_length": (1, 512), "num_beams": (1, 8)}
+MAX_VARIANTS = 8
+
+
+def check_variants(variants):
+    """Why ``variants`` can't be served, or None if it can."""
+    if not isinstance(variants, list) or not 0 < len(variants) <= MAX_VARIANTS:
+        return f"variants must be a list of 1 to {MAX_VARIANTS} configs"
+    for config in variants:
+        if not isinstance(config, dict):
+            return "each variant must be an object"
+        for key, value in config.items():
+            if key not in VARIANT_LIMITS:
+                return f"{key!r} is not one of {list(VARIANT_LIMITS)}"
+            low, high = VARIANT_LIMITS[key]
+            if type(value) is not int or not low <= value <= high:
+                return f"{key} must be an integer from {low} to {high}"
+    return None
+
+
 class SummarizerApp:
-    def __init__(self):
+    def __init__(
+        self,
+        max_batch_size=8,
+        max_wait_ms=20,
+        cache_dir="cache/summaries",
+        backends=None,
+    ):
+        self.backends = {**MODEL_BACKENDS, **(backends or {})}
+        self.cache = SummaryCache(max_entries=4096, cache_dir=cache_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained("t5-small")
         self.models = {}
-        for name, path in MODELS.items():
-            model = SummarizerModel()
-            model.load_state_dict(torch.load(f"models/{path}"))
-            self.models[name] = model
-        
-        self.current_model = self.models["CNN/DailyMail"]
+        self.schedulers = {}
+        self.locks = {name: threading.Lock() for name in MODELS}
+        for name in MODELS:
+            self.schedulers[name] = BatchScheduler(
+                lambda name=name: self.get_model(name),
+                max_batch_size,
+                max_wait_ms,
+                lock=self.locks[name],
+            )
+
+    def get_model(self, model_name):
+        # Models are built on first request; the same lock serializes every
+        # generate call on the model, batched or not.
+        with self.locks[model_name]:
+            if model_name not in self.models:
+                model = SummarizerModel(tokenizer=self.tokenizer, pretrained=False)
+                model.cache = self.cache
+                path = resolve_checkpoint(f"models/{MODELS[model_name]}")
+                model.load_checkpoint(path)
+                model.set_backend(self.backends[model_name], export_dir_for(path))
+                self.models[model_name] = model
+            return self.models[model_name]
+
+    async def summarize(self, text, model_name):
+        metrics.inc("app_requests_total")
+        with metrics.timer("app_request_seconds"):
+            return await self.schedulers[model_name].submit(text)
+
+    def _generate_serial(self, text, model_name):
+        model = self.get_model(model_name)
+        with self.locks[model_name]:
+            return model.generate_summary(text)
+
+    def _summarize_long(self, text, model_name):
+        model = self.get_model(model_name)
+        with self.locks[model_name]:
+            return model.summarize_long(text)
+
+    def _generate_variants(self, text, model_name, configs):
+        model = self.get_model(model_name)
+        with self.locks[model_name]:
+            return model.generate_variants(text, configs)
+
+    async def summarize_long(self, text, model_name):
+        # get_model may load a checkpoint, so it runs off the event loop too.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._summarize_long, text, model_name
+        )
 
-    def summarize(self, text, model_name):
-        self.current_model = self.models[model_name]
-        return self.current_model.generate_summary(text)
+    async def summarize_variants(self, text, model_name, configs):
+        # One encoder pass serves every length/beam setting.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._generate_variants, text, model_name, configs
+        )
+
+    async def summarize_serial(self, text, model_name):
+        metrics.inc("app_requests_total")
+        with metrics.timer("app_request_seconds"):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._generate_serial, text, model_name
+            )
 
 app = SummarizerApp()
+api = FastAPI()
+
+
+@api.post("/api/summarize")
+async def summarize_endpoint(request: Request):
+    payload = await request.json()
+    model_name = payload.get("model", "CNN/DailyMail")
+    if payload.get("long", False):
+        result = await app.summarize_long(payload["text"], model_name)
+        return {**result, "model": model_name}
+    if "variants" in payload:
+        error = check_variants(payload["variants"])
+        if error is not None:
+            raise HTTPException(status_code=400, detail=error)
+        summaries = await app.summarize_variants(
+            payload["text"], model_name, payload["variants"]
+        )
+        return {"summaries": summaries, "model": model_name}
+    if payload.get("batch", True):
+        summary = await app.summarize(payload["text"], model_name)
+    else:
+        summary = await app.summarize_serial(payload["text"], model_name)
+    return {"summary": summary, "model": model_name}
+
+
+@api.get("/api/cache")
+async def cache_endpoint():
+    return {
+        **app.cache.stats,
+        "entries": len(app.cache.entries),
+        "disk_entries": len(app.cache.disk),
+    }
+
+
+# Populated when the app runs with SUMMARIZER_METRICS=1.
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return metrics.registry.to_prometheus()
+
+
+@api.get("/api/metrics")
+async def metrics_json_endpoint():
+    return metrics.registry.to_dict()
 
 # Example texts
 EXAMPLES = [
@@ -65,13 +205,20 @@ with gr.Blocks(css="footer {display: none}") as demo:
         inputs=[text, model_choice],
         outputs=summary,
         fn=app.summarize,
-        cache_examples=True
+        cache_examples=False
     )
     
-    button.click(app.summarize, inputs=[text, model_choice], outputs=summary)
+    button.click(
+        app.summarize,
+        inputs=[text, model_choice],
+        outputs=summary,
+        concurrency_limit=None,
+    )
     clear.click(lambda: ["", "CNN/DailyMail"], outputs=[text, model_choice])
 
 if __name__ == "__main__":
-    demo.launch()
+    import uvicorn
+
+    uvicorn.run(gr.mount_gradio_app(api, demo, path="/"), host="127.0.0.1", port=7861)
 
 
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchScheduler:
+    """Coalesce concurrent summarize requests for one model into batches.
+
+    Requests wait in a queue for at most ``max_wait_ms`` (or until
+    ``max_batch_size`` are pending) and are then generated together with
+    ``SummarizerModel.generate_summaries`` on a dedicated thread under
+    ``lock``, so only one batch per model runs at a time and the event loop
+    stays free. Other callers of the same model share the ``lock`` to keep
+    their generate calls from overlapping with a batch. ``get_model`` is
+    called on that thread, so a lazily loaded model is built off the event
+    loop on the first batch.
+    """
+
+    def __init__(self, get_model, max_batch_size=8, max_wait_ms=20, lock=None):
+        self.get_model = get_model
+        self.lock = lock or threading.Lock()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.loop = None
+        self.queue = None
+        self.worker = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop or self.worker.done():
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self._run())
+
+    async def submit(self, text):
+        self._ensure_worker()
+        future = self.loop.create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def _collect(self):
+        requests = [await self.queue.get()]
+        deadline = self.loop.time() + self.max_wait
+        while len(requests) < self.max_batch_size:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                requests.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return requests
+
+    def _generate(self, texts):
+        model = self.get_model()
+        with self.lock:
+            return model.generate_summaries(texts)
+
+    async def _run(self):
+        while True:
+            requests = await self._collect()
+            texts = [text for text, _ in requests]
+            try:
+                summaries = await self.loop.run_in_executor(
+                    self.executor, self._generate, texts
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            for (_, future), summary in zip(requests, summaries):
+                if not future.done():
+                    future.set_result(summary)
@@ -0,0 +1,328 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from functools import partial
+
+import torch
+from datasets import Dataset
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+from torch.utils.data import DataLoader
+from transformers import PreTrainedTokenizerFast, T5Config, __version__
+
+from src.data.dataio import SummarizerDataset, collate_batch
+from src.model.model import SummarizerModel, resolve_checkpoint
+from src.train.train import build_optimizer, training_step
+
+VOCAB_SIZE = 512
+
+
+def tiny_tokenizer(vocab_size=VOCAB_SIZE):
+    """Word-level tokenizer over synthetic words, built without downloads."""
+    vocab = {"<pad>": 0, "</s>": 1, "<unk>": 2, "summarize:": 3}
+    for i in range(len(vocab), vocab_size):
+        vocab[f"w{i}"] = i
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="$A </s>", special_tokens=[("</s>", 1)]
+    )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        pad_token="<pad>",
+        eos_token="</s>",
+        unk_token="<unk>",
+    )
+
+
+def tiny_config(vocab_size=VOCAB_SIZE):
+    return T5Config(
+        vocab_size=vocab_size,
+        d_model=64,
+        d_ff=256,
+        d_kv=16,
+        num_layers=2,
+        num_heads=4,
+        decoder_start_token_id=0,
+        pad_token_id=0,
+        eos_token_id=1,
+    )
+
+
+def build_model(checkpoint=None, model_name="t5-small"):
+    """A local checkpoint if given, otherwise a tiny random T5."""
+    if checkpoint is not None:
+        model = SummarizerModel(model_name, pretrained=False)
+        model.load_checkpoint(resolve_checkpoint(checkpoint))
+    else:
+        torch.manual_seed(0)
+        model = SummarizerModel(tokenizer=tiny_tokenizer(), config=tiny_config())
+    return model.eval()
+
+
+def random_texts(tokenizer, count, num_tokens, seed=0):
+    """Texts of about ``num_tokens`` tokens, decoded from random ids."""
+    special = set(tokenizer.all_special_ids)
+    ids = [idx for idx in range(len(tokenizer)) if idx not in special]
+    rng = random.Random(seed)
+    return [tokenizer.decode(rng.choices(ids, k=num_tokens)) for _ in range(count)]
+
+
+def timed(fn, repeats, warmup):
+    for _ in range(warmup):
+        fn()
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def result(name, params, seconds, items):
+    median = statistics.median(seconds)
+    return {
+        "name": name,
+        "params": params,
+        "median_ms": median * 1000,
+        "min_ms": min(seconds) * 1000,
+        "items_per_sec": items / median,
+    }
+
+
+def bench_generation(model, args):
+    rows = []
+    grid = itertools.product(
+        args.input_lengths, args.batch_sizes, args.num_beams, args.max_lengths
+    )
+    for input_length, batch_size, num_beams, max_length in grid:
+        texts = random_texts(model.tokenizer, batch_size, input_length)
+        if batch_size == 1:
+            fn = partial(model.generate_summary, texts[0], max_length, num_beams)
+        else:
+            fn = partial(
+                model.generate_summaries,
+                texts,
+                max_length,
+                num_beams,
+                max_batch_size=batch_size,
+            )
+        params = {
+            "input_length": input_length,
+            "batch_size": batch_size,
+            "num_beams": num_beams,
+            "max_length": max_length,
+        }
+        rows.append(result("generate", params, timed(fn, args.repeats, 1), batch_size))
+    return rows
+
+
+def bench_data(model, args):
+    texts = random_texts(model.tokenizer, args.num_examples, max(args.input_lengths))
+    summaries = random_texts(model.tokenizer, args.num_examples, 32, seed=1)
+    examples = Dataset.from_dict({"text": texts, "summary": summaries})
+
+    rows = []
+    for padding in ["max_length", "do_not_pad"]:
+        dataset = SummarizerDataset(
+            examples, model.tokenizer, "text", "summary", padding=padding
+        )
+        collate_fn = None
+        if padding == "do_not_pad":
+            collate_fn = partial(
+                collate_batch, pad_token_id=model.tokenizer.pad_token_id
+            )
+        loader = DataLoader(dataset, batch_size=16, collate_fn=collate_fn)
+
+        def iterate(loader=loader):
+            for _ in loader:
+                pass
+
+        params = {
+            "padding": padding,
+            "batch_size": 16,
+            "input_length": max(args.input_lengths),
+            "num_examples": args.num_examples,
+        }
+        rows.append(
+            result("dataloader", params, timed(iterate, args.repeats, 1), len(dataset))
+        )
+    return rows
+
+
+def bench_train_step(model, args):
+    batch_size = max(args.batch_sizes)
+    input_length = max(args.input_lengths)
+    vocab_size = model.model.config.vocab_size
+    generator = torch.Generator().manual_seed(0)
+    batch = {
+        "input_ids": torch.randint(
+            4, vocab_size, (batch_size, input_length), generator=generator
+        ),
+        "attention_mask": torch.ones(batch_size, input_length, dtype=torch.long),
+        "labels": torch.randint(
+            4, vocab_size, (batch_size, input_length // 4), generator=generator
+        ),
+    }
+
+    # A copy keeps the benchmarked weights out of the generation runs.
+    state = {k: v.clone() for k, v in model.state_dict().items()}
+    model.train()
+    optimizer = build_optimizer(model)
+
+    def step():
+        training_step(model, batch, model.device)
+        optimizer.step()
+        optimizer.zero_grad()
+
+    seconds = timed(step, args.repeats, 1)
+    model.load_state_dict(state)
+    model.eval()
+    params = {"batch_size": batch_size, "input_length": input_length}
+    return [result("train_step", params, seconds, batch_size)]
+
+
+def bench_variants(model, args):
+    """One text decoded under every config, with and without a shared encoder."""
+    configs = [
+        {"max_length": max_length, "num_beams": num_beams}
+        for num_beams in args.num_beams
+        for max_length in args.max_lengths
+    ]
+
+    def separate(text):
+        return [model.generate_summary(text, **config) for config in configs]
+
+    def shared(text):
+        model.encoder_cache.clear()
+        return model.generate_variants(text, configs)
+
+    rows = []
+    for input_length in args.input_lengths:
+        text = random_texts(model.tokenizer, 1, input_length)[0]
+        modes = {
+            "separate": partial(separate, text),
+            "shared_encoder": partial(shared, text),
+            # Warm: the encoder output is already cached from a prior call.
+            "cached_encoder": partial(model.generate_variants, text, configs),
+        }
+        for mode, fn in modes.items():
+            params = {
+                "input_length": input_length,
+                "configs": len(configs),
+                "mode": mode,
+            }
+            rows.append(result("variants", params, timed(fn, args.repeats, 1), 1))
+    return rows
+
+
+SUITES = {
+    "generate": bench_generation,
+    "variants": bench_variants,
+    "data": bench_data,
+    "train": bench_train_step,
+}
+
+
+def case_id(row):
+    params = ",".join(f"{k}={v}" for k, v in sorted(row["params"].items()))
+    return f"{row['name']}[{params}]"
+
+
+# Runs that differ in any of these measure different things.
+COMPARABLE_META = ["model", "device", "threads"]
+
+
+def compare(results, meta, baseline, tolerance):
+    """Rows whose median latency grew by more than ``tolerance``."""
+    for key in COMPARABLE_META:
+        if key in baseline["meta"] and baseline["meta"][key] != meta[key]:
+            raise ValueError(
+                f"Baseline was run with {key}={baseline['meta'][key]!r}, "
+                f"this run with {meta[key]!r}"
+            )
+    previous = {case_id(row): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        old = previous.get(case_id(row))
+        if old is None:
+            continue
+        change = row["median_ms"] / old["median_ms"] - 1
+        row["change"] = change
+        if change > tolerance:
+            regressions.append(row)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference and data")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument(
+        "--checkpoint", default=None, help="local checkpoint (default: tiny T5)"
+    )
+    parser.add_argument(
+        "--model-name", default="t5-small", help="config of --checkpoint"
+    )
+    parser.add_argument("--input-lengths", type=int, nargs="+", default=[32, 128, 512])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--num-beams", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--max-lengths", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--num-examples", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", default="results/bench.json")
+    parser.add_argument("--compare", default=None, help="baseline JSON to check")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model = build_model(args.checkpoint, args.model_name)
+
+    results = []
+    for suite in args.suites:
+        for row in SUITES[suite](model, args):
+            print(
+                f"⏱️ {case_id(row)}: {row['median_ms']:.1f} ms, "
+                f"{row['items_per_sec']:.1f} items/s"
+            )
+            results.append(row)
+
+    meta = {
+        "model": args.checkpoint or "tiny-random-t5",
+        "device": str(model.device),
+        "threads": torch.get_num_threads(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "transformers": __version__,
+    }
+    report = {"meta": meta, "results": results}
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file_handle:
+            baseline = json.load(file_handle)
+        try:
+            regressions = compare(results, meta, baseline, args.tolerance)
+        except ValueError as error:
+            sys.exit(f"❌ Not comparable with {args.compare}: {error}")
+        for row in regressions:
+            print(f"🐢 {case_id(row)}: {row['change']:+.0%} slower")
+        if not regressions:
+            print(f"✅ No regressions over {args.tolerance:.0%} against {args.compare}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file_handle:
+        json.dump(report, file_handle, indent=2)
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from src.test import TEST_CASES
+
+
+def post(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        json.load(response)
+    return time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def run_load(url, model, num_requests, concurrency, batch):
+    payloads = [
+        {
+            "text": TEST_CASES[i % len(TEST_CASES)]["text"],
+            "model": model,
+            "batch": batch,
+        }
+        for i in range(num_requests)
+    ]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda payload: post(url, payload), payloads))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": "batched" if batch else "serial",
+        "requests": num_requests,
+        "concurrency": concurrency,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "requests_per_sec": num_requests / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/summarize")
+    parser.add_argument("--url", default="http://127.0.0.1:7861/api/summarize")
+    parser.add_argument("--model", default="CNN/DailyMail")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = []
+    for batch in [False, True]:
+        result = run_load(args.url, args.model, args.requests, args.concurrency, batch)
+        print(
+            f"⏱️ {result['mode']}: p50 {result['p50_ms']:.0f} ms, "
+            f"p99 {result['p99_ms']:.0f} ms, {result['requests_per_sec']:.2f} req/s"
+        )
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file_handle:
+            json.dump(results, file_handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
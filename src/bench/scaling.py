@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+
+from src.model.model import SummarizerModel
+from src.train.distributed import (
+    all_reduce_sum,
+    get_rank,
+    get_world_size,
+    is_distributed,
+    is_main_process,
+    launch,
+)
+from src.train.train import build_optimizer, training_step
+
+
+def _barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+def measure(model_name, batch_size, steps, warmup, input_length, output_path):
+    """Time data-parallel training steps on random tokens on every rank."""
+    model = SummarizerModel(model_name)
+    model.train()
+    forward = DistributedDataParallel(model) if is_distributed() else model
+    optimizer = build_optimizer(model)
+
+    generator = torch.Generator().manual_seed(get_rank())
+    vocab_size = model.model.config.vocab_size
+    batch = {
+        "input_ids": torch.randint(
+            2, vocab_size, (batch_size, input_length), generator=generator
+        ),
+        "attention_mask": torch.ones(batch_size, input_length, dtype=torch.long),
+        "labels": torch.randint(
+            2, vocab_size, (batch_size, input_length // 4), generator=generator
+        ),
+    }
+
+    for step in range(warmup + steps):
+        if step == warmup:
+            _barrier()
+            start = time.perf_counter()
+        training_step(forward, batch, model.device)
+        optimizer.step()
+        optimizer.zero_grad()
+    _barrier()
+    elapsed = time.perf_counter() - start
+
+    samples = all_reduce_sum(batch_size * steps)
+    if is_main_process():
+        with open(output_path, "w", encoding="utf-8") as file_handle:
+            json.dump(
+                {"workers": get_world_size(), "samples_per_sec": samples / elapsed},
+                file_handle,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Data-parallel scaling report")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--model-name", default="t5-small")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--input-length", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    report = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for workers in args.workers:
+            output_path = os.path.join(tmp_dir, f"{workers}.json")
+            launch(
+                measure,
+                workers,
+                args.model_name,
+                args.batch_size,
+                args.steps,
+                args.warmup,
+                args.input_length,
+                output_path,
+            )
+            with open(output_path, encoding="utf-8") as file_handle:
+                report.append(json.load(file_handle))
+
+    baseline = report[0]["samples_per_sec"] / report[0]["workers"]
+    for row in report:
+        row["speedup"] = row["samples_per_sec"] / baseline
+        row["efficiency"] = row["speedup"] / row["workers"]
+        print(
+            f"🧵 {row['workers']} workers: {row['samples_per_sec']:.1f} samples/s, "
+            f"{row['speedup']:.2f}x, {row['efficiency']:.0%} efficiency"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file_handle:
+            json.dump(report, file_handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
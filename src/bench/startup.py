@@ -0,0 +1,74 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+MODES = ["eager", "lazy"]
+CHECKPOINTS = ["models/cnn_dailymail_epoch_5.pth", "models/xsum_epoch_5.pth"]
+
+
+def measure(mode, checkpoints):
+    start = time.perf_counter()
+
+    # Imports are part of what is being measured.
+    # pylint: disable=import-outside-toplevel
+    import torch
+    from transformers import AutoTokenizer
+
+    from src.model.model import SummarizerModel, resolve_checkpoint
+
+    if mode == "eager":
+        # The original SummarizerApp constructor: every model is loaded from
+        # pretrained weights, then overwritten by its checkpoint.
+        for path in checkpoints:
+            model = SummarizerModel()
+            model.load_state_dict(torch.load(path))
+    else:
+        tokenizer = AutoTokenizer.from_pretrained("t5-small")
+        model = SummarizerModel(tokenizer=tokenizer, pretrained=False)
+        model.load_checkpoint(resolve_checkpoint(checkpoints[0]))
+
+    return {
+        "mode": mode,
+        "seconds": time.perf_counter() - start,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app model startup")
+    parser.add_argument("--mode", choices=MODES)
+    parser.add_argument("--checkpoints", nargs="+", default=CHECKPOINTS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.checkpoints)))
+        return
+
+    # Each mode runs in a fresh interpreter so resident memory is not shared.
+    for mode in MODES:
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "src.bench.startup",
+                "--mode",
+                mode,
+                "--checkpoints",
+                *args.checkpoints,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"🚀 {mode}: {result['seconds']:.2f} s to first model, "
+            f"{result['max_rss_mb']:.0f} MB peak RSS"
+        )
+
+
+if __name__ == "__main__":
+    main()
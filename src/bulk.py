@@ -0,0 +1,249 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import torch
+
+from src.model.backends import BACKENDS, export_dir_for
+from src.model.model import SummarizerModel, resolve_checkpoint
+
+_worker = {}
+
+
+def read_records(path):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=1024):
+            yield from batch.to_pylist()
+    else:
+        with open(path, encoding="utf-8") as file_handle:
+            for line in file_handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _init_worker(checkpoint, backend, num_threads, long_documents):
+    # One model per process, pinned to its own slice of the CPU threads so
+    # workers do not oversubscribe the cores.
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+    path = resolve_checkpoint(checkpoint)
+    model = SummarizerModel(pretrained=False)
+    model.load_checkpoint(path)
+    model.set_backend(backend, export_dir_for(path))
+    _worker["model"] = model
+    _worker["long"] = long_documents
+
+
+def _summarize_chunk(chunk_index, texts):
+    model = _worker["model"]
+    start = time.perf_counter()
+    if _worker["long"]:
+        summaries = [model.summarize_long(text)["summary"] for text in texts]
+    else:
+        summaries = model.generate_summaries(texts)
+    elapsed = time.perf_counter() - start
+
+    if _worker["long"]:
+        # Long mode reads every token, split over windows.
+        input_ids = model.tokenizer(texts).input_ids
+    else:
+        # Count what the encoder saw: prefixed and cut at 512 tokens.
+        input_ids = model.tokenizer(
+            [f"summarize: {text}" for text in texts], max_length=512, truncation=True
+        ).input_ids
+    tokens_in = sum(len(ids) for ids in input_ids)
+    stats = {
+        "pid": os.getpid(),
+        "docs": len(texts),
+        "tokens_in": tokens_in,
+        "seconds": elapsed,
+    }
+    return chunk_index, summaries, stats
+
+
+class Progress:
+    """Completed chunks and the matching output size, saved atomically.
+
+    Chunks below ``watermark`` are all done; ``done`` holds finished chunks
+    above it, which only happens when results are written as they arrive.
+    """
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.watermark = 0
+        self.done = set()
+        self.output_bytes = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file_handle:
+                state = json.load(file_handle)
+            if state["chunk_size"] != chunk_size:
+                raise ValueError(
+                    f"{path} was written with chunk_size={state['chunk_size']}"
+                )
+            self.watermark = state["watermark"]
+            self.done = set(state["done"])
+            self.output_bytes = state["output_bytes"]
+
+    def complete(self, chunk_index):
+        self.done.add(chunk_index)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def is_done(self, chunk_index):
+        return chunk_index < self.watermark or chunk_index in self.done
+
+    def save(self, output_bytes):
+        self.output_bytes = output_bytes
+        state = {
+            "chunk_size": self.chunk_size,
+            "watermark": self.watermark,
+            "done": sorted(self.done),
+            "output_bytes": output_bytes,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file_handle:
+            json.dump(state, file_handle)
+        os.replace(tmp_path, self.path)
+
+
+def _chunks(records, chunk_size, progress):
+    # Chunks below the watermark are skipped without being materialized.
+    records = itertools.islice(records, progress.watermark * chunk_size, None)
+    for chunk_index in itertools.count(progress.watermark):
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        if not progress.is_done(chunk_index):
+            yield chunk_index, chunk
+
+
+def report(worker_stats):
+    for pid, stats in sorted(worker_stats.items()):
+        print(
+            f"⚙️ worker {pid}: {stats['docs']} docs, "
+            f"{stats['docs'] / stats['seconds']:.2f} docs/s, "
+            f"{stats['tokens_in'] / stats['seconds']:.0f} tokens/s"
+        )
+
+
+def run(args):
+    progress = Progress(f"{args.output}.progress.json", args.chunk_size)
+    if progress.watermark:
+        print(f"↩️ Resuming after {progress.watermark * args.chunk_size} documents")
+
+    if progress.output_bytes and not os.path.exists(args.output):
+        raise FileNotFoundError(
+            f"{progress.path} records {progress.output_bytes} bytes of "
+            f"{args.output}, which is missing; delete the progress file to restart"
+        )
+    mode = "r+b" if os.path.exists(args.output) else "wb"
+    with open(args.output, mode) as output:
+        # Anything written after the last saved progress is redone.
+        output.truncate(progress.output_bytes)
+        output.seek(progress.output_bytes)
+        worker_stats = _summarize_all(args, progress, output)
+    report(worker_stats)
+
+
+def _summarize_all(args, progress, output):
+    chunks = {}
+    worker_stats = defaultdict(lambda: {"docs": 0, "tokens_in": 0, "seconds": 0.0})
+    written, start = 0, time.perf_counter()
+
+    def write(future):
+        nonlocal written
+        chunk_index, summaries, stats = future.result()
+        records = chunks.pop(chunk_index)
+        for offset, (record, summary) in enumerate(zip(records, summaries)):
+            row = {"index": chunk_index * args.chunk_size + offset}
+            if args.id_field in record:
+                row["id"] = record[args.id_field]
+            row["summary"] = summary
+            output.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+        progress.complete(chunk_index)
+        for key in ["docs", "tokens_in", "seconds"]:
+            worker_stats[stats["pid"]][key] += stats[key]
+
+        written += 1
+        if written % args.checkpoint_every == 0:
+            output.flush()
+            os.fsync(output.fileno())
+            progress.save(output.tell())
+            docs = sum(stats["docs"] for stats in worker_stats.values())
+            elapsed = time.perf_counter() - start
+            print(f"📦 {docs} docs, {docs / elapsed:.2f} docs/s")
+
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.checkpoint, args.backend, args.threads, args.long),
+    ) as pool:
+        for chunk_index, records in _chunks(
+            read_records(args.input), args.chunk_size, progress
+        ):
+            chunks[chunk_index] = records
+            texts = [record[args.text_field] for record in records]
+            pending.append(pool.submit(_summarize_chunk, chunk_index, texts))
+
+            # Keep a bounded number of chunks in flight so the input is
+            # streamed rather than read up front.
+            while len(pending) >= args.workers * 2:
+                if args.ordered:
+                    write(pending.popleft())
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        write(future)
+
+        while pending:
+            write(pending.popleft())
+
+    output.flush()
+    os.fsync(output.fileno())
+    progress.save(output.tell())
+    return worker_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a JSONL/Parquet corpus")
+    parser.add_argument("input", help="input .jsonl or .parquet file")
+    parser.add_argument("output", help="output .jsonl file")
+    parser.add_argument("--checkpoint", default="models/cnn_dailymail_epoch_5.pth")
+    parser.add_argument("--backend", choices=BACKENDS, default="eager")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=32)
+    parser.add_argument("--checkpoint-every", type=int, default=10)
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument(
+        "--unordered",
+        dest="ordered",
+        action="store_false",
+        help="write chunks as they finish, tagged with their input index",
+    )
+    parser.add_argument(
+        "--long", action="store_true", help="use chunked long-document mode"
+    )
+    args = parser.parse_args()
+    args.threads = args.threads or max(os.cpu_count() // args.workers, 1)
+
+    print(f"📚 Summarizing {args.input} with {args.workers} workers")
+    run(args)
+    print("\n✅ Bulk summarization completed!")
+
+
+if __name__ == "__main__":
+    main()
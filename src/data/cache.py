@@ -0,0 +1,213 @@
+import bisect
+import hashlib
+import itertools
+import json
+import os
+import shutil
+
+import numpy as np
+import torch
+
+from src.utils import metrics
+
+ARRAYS = ["input_ids", "input_offsets", "labels", "label_offsets"]
+
+
+def cache_key(tokenizer, spec):
+    identity = {
+        "tokenizer": tokenizer.name_or_path,
+        "vocab_size": len(tokenizer),
+        **spec,
+    }
+    encoded = json.dumps(identity, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def _tokenize(batch, tokenizer, text_field, summary_field, max_input, max_label):
+    inputs = tokenizer(
+        [f"summarize: {text}" for text in batch[text_field]],
+        truncation=True,
+        max_length=max_input,
+    )
+    labels = tokenizer(batch[summary_field], truncation=True, max_length=max_label)
+    return {"input_ids": inputs.input_ids, "labels": labels.input_ids}
+
+
+def _flatten(sequences):
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum([len(sequence) for sequence in sequences], out=offsets[1:])
+    values = np.fromiter(
+        itertools.chain.from_iterable(sequences), dtype=np.int32, count=offsets[-1]
+    )
+    return values, offsets
+
+
+def build_token_cache(
+    examples,
+    tokenizer,
+    text_field,
+    summary_field,
+    directory,
+    spec,
+    num_proc=None,
+    num_shards=None,
+):
+    """Tokenize ``examples`` once and write them as flat token shards.
+
+    Each shard holds the token ids of inputs and labels concatenated into one
+    int32 array, plus int64 offsets marking where every example starts.
+    """
+    tokenized = examples.map(
+        _tokenize,
+        batched=True,
+        num_proc=num_proc,
+        remove_columns=examples.column_names,
+        fn_kwargs={
+            "tokenizer": tokenizer,
+            "text_field": text_field,
+            "summary_field": summary_field,
+            "max_input": spec["max_input_length"],
+            "max_label": spec["max_label_length"],
+        },
+        desc="Tokenizing",
+    )
+
+    num_shards = num_shards or max(num_proc or 1, 1)
+    num_shards = min(num_shards, max(len(tokenized), 1))
+    tmp_directory = f"{directory}.tmp-{os.getpid()}"
+    os.makedirs(tmp_directory, exist_ok=True)
+
+    shard_sizes = []
+    for index in range(num_shards):
+        shard = tokenized.shard(num_shards, index, contiguous=True)
+        input_ids, input_offsets = _flatten(shard["input_ids"])
+        labels, label_offsets = _flatten(shard["labels"])
+        arrays = dict(zip(ARRAYS, [input_ids, input_offsets, labels, label_offsets]))
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_directory, f"shard_{index:05d}.{name}.npy"), array)
+        shard_sizes.append(len(shard))
+
+    with open(os.path.join(tmp_directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**spec, "shard_sizes": shard_sizes}, f, indent=2)
+
+    if os.path.isdir(directory):
+        shutil.rmtree(tmp_directory)
+    else:
+        os.replace(tmp_directory, directory)
+    return directory
+
+
+class TokenizedDataset(torch.utils.data.Dataset):
+    """Read-only view over token shards written by ``build_token_cache``.
+
+    Shards are memory-mapped, so opening the cache costs no copies and the
+    pages are shared between DataLoader workers and concurrent runs. The maps
+    are opened lazily in each process and left out of pickles, since
+    pickling a memmap copies the whole array into every spawned worker.
+    """
+
+    def __init__(self, directory, pad_token_id, padding="max_length"):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.directory = directory
+        self.pad_token_id = pad_token_id
+        self.padding = padding
+        self._shards = None
+        self.starts = np.cumsum([0] + self.meta["shard_sizes"]).tolist()
+
+    def __getstate__(self):
+        return {**self.__dict__, "_shards": None}
+
+    @property
+    def shards(self):
+        if self._shards is None:
+            self._shards = [
+                {
+                    name: np.load(
+                        os.path.join(self.directory, f"shard_{index:05d}.{name}.npy"),
+                        mmap_mode="r",
+                    )
+                    for name in ARRAYS
+                }
+                for index in range(len(self.meta["shard_sizes"]))
+            ]
+        return self._shards
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def _sequence(self, shard, name, offsets, local, length, pad_value):
+        start, end = shard[offsets][local], shard[offsets][local + 1]
+        sequence = torch.from_numpy(shard[name][start:end].astype(np.int64))
+        if self.padding == "max_length":
+            sequence = torch.nn.functional.pad(
+                sequence, (0, length - len(sequence)), value=pad_value
+            )
+        return sequence
+
+    def __getitem__(self, idx):
+        metrics.inc("dataset_items_total")
+        with metrics.timer("dataset_getitem_seconds"):
+            return self._example(idx)
+
+    def _example(self, idx):
+        shard_index = bisect.bisect_right(self.starts, idx) - 1
+        shard = self.shards[shard_index]
+        local = idx - self.starts[shard_index]
+
+        input_ids = self._sequence(
+            shard,
+            "input_ids",
+            "input_offsets",
+            local,
+            self.meta["max_input_length"],
+            self.pad_token_id,
+        )
+        labels = self._sequence(
+            shard,
+            "labels",
+            "label_offsets",
+            local,
+            self.meta["max_label_length"],
+            -100,
+        )
+        return {
+            "input_ids": input_ids,
+            "attention_mask": (input_ids != self.pad_token_id).long(),
+            "labels": labels,
+        }
+
+    def input_lengths(self):
+        return np.concatenate(
+            [np.diff(shard["input_offsets"]) for shard in self.shards]
+        ).tolist()
+
+
+def load_token_cache(
+    cache_dir,
+    spec,
+    load_examples,
+    tokenizer,
+    text_field,
+    summary_field,
+    padding="max_length",
+    num_proc=None,
+):
+    """Open the cached token shards for ``spec``, building them on first use.
+
+    ``load_examples`` is only called on a cache miss, so warm runs never
+    touch the raw dataset.
+    """
+    directory = os.path.join(cache_dir, cache_key(tokenizer, spec))
+    if not os.path.isdir(directory):
+        print(f"🔤 Building token cache {directory}")
+        build_token_cache(
+            load_examples(),
+            tokenizer,
+            text_field,
+            summary_field,
+            directory,
+            spec,
+            num_proc=num_proc,
+        )
+    return TokenizedDataset(directory, tokenizer.pad_token_id, padding)
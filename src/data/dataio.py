@@ -1,68 +1,423 @@
+import random
+from functools import partial
+from itertools import islice
+
 import torch
-from datasets import load_dataset
-from torch.utils.data import DataLoader
+from datasets.distributed import split_dataset_by_node
+from torch.utils.data import DataLoader, DistributedSampler
+
+from src.data.cache import load_token_cache
+from src.data.sources import get_source
+from src.utils import metrics
+
+MAX_INPUT_LENGTH = 512
+MAX_LABEL_LENGTH = 128
+
+
+def encode_example(tokenizer, text, summary, padding="max_length"):
+    inputs = tokenizer(
+        f"summarize: {text}",
+        padding=padding,
+        truncation=True,
+        max_length=MAX_INPUT_LENGTH,
+        return_tensors="pt",
+    )
+
+    labels = tokenizer(
+        summary,
+        padding=padding,
+        truncation=True,
+        max_length=MAX_LABEL_LENGTH,
+        return_tensors="pt",
+    ).input_ids
+
+    labels[labels == tokenizer.pad_token_id] = -100
 
-DATASET_CONFIGS = {
-    "xsum": ("EdinburghNLP/xsum", None, "document", "summary"),
-    "cnn_dailymail": ("abisee/cnn_dailymail", "3.0.0", "article", "highlights"),
-}
+    return {
+        "input_ids": inputs.input_ids.squeeze(0),
+        "attention_mask": inputs.attention_mask.squeeze(0),
+        "labels": labels.squeeze(0),
+    }
 
 
 class SummarizerDataset(torch.utils.data.Dataset):
-    def __init__(self, dataset, tokenizer, text_field, summary_field):
+    def __init__(
+        self, dataset, tokenizer, text_field, summary_field, padding="max_length"
+    ):
         self.examples = dataset
         self.tokenizer = tokenizer
         self.text_field = text_field
         self.summary_field = summary_field
+        self.padding = padding
 
     def __len__(self):
         return len(self.examples)
 
     def __getitem__(self, idx):
-        text = self.examples[idx][self.text_field]
-        summary = self.examples[idx][self.summary_field]
-
-        inputs = self.tokenizer(
-            f"summarize: {text}",
-            padding="max_length",
-            truncation=True,
-            max_length=512,
-            return_tensors="pt",
+        metrics.inc("dataset_items_total")
+        with metrics.timer("dataset_getitem_seconds"):
+            return self._example(idx)
+
+    def _example(self, idx):
+        example = self.examples[idx]
+        return encode_example(
+            self.tokenizer,
+            example[self.text_field],
+            example[self.summary_field],
+            self.padding,
         )
 
-        labels = self.tokenizer(
-            summary,
-            padding="max_length",
-            truncation=True,
-            max_length=128,
-            return_tensors="pt",
-        ).input_ids
+    def input_lengths(self):
+        texts = [f"summarize: {text}" for text in self.examples[self.text_field]]
+        encoded = self.tokenizer(texts, truncation=True, max_length=MAX_INPUT_LENGTH)
+        return [len(ids) for ids in encoded.input_ids]
 
-        labels[labels == self.tokenizer.pad_token_id] = -100
 
-        return {
-            "input_ids": inputs.input_ids.squeeze(),
-            "attention_mask": inputs.attention_mask.squeeze(),
-            "labels": labels.squeeze(),
-        }
+class StreamingSummarizerDataset(torch.utils.data.IterableDataset):
+    """Examples read lazily from a streamed split and tokenized on the fly.
 
+    Each rank and each DataLoader worker iterates its own shard of the
+    stream, so memory stays flat however large the corpus is. With a
+    ``size`` every rank gets exactly ``size // num_replicas`` examples, so
+    ranks run the same number of steps; training needs a size for that.
+    Workers are dealt whole runs of ``batch_size`` examples, so only the
+    last batch of an epoch can be partial and the loader yields exactly
+    ``len(loader)`` batches.
+    """
 
-def get_data_loaders(dataset_name, batch_size, train_size, val_size, tokenizer):
-    path, version, text_field, summary_field = DATASET_CONFIGS[dataset_name]
-    dataset = load_dataset(path, version) if version else load_dataset(path)
+    def __init__(
+        self,
+        source,
+        split,
+        tokenizer,
+        padding="max_length",
+        size=None,
+        num_replicas=1,
+        rank=0,
+        shuffle_buffer=0,
+        seed=0,
+        batch_size=1,
+    ):
+        self.source = source
+        self.split = split
+        self.tokenizer = tokenizer
+        self.padding = padding
+        self.size = size
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.batch_size = batch_size
+        self.epoch = 0
 
-    train_dataset = SummarizerDataset(
-        dataset["train"].select(range(train_size)), tokenizer, text_field, summary_field
-    )
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        if self.size is None:
+            raise TypeError("Streamed split without a size has no length")
+        return self.size // self.num_replicas
+
+    def __iter__(self):
+        worker = torch.utils.data.get_worker_info()
+        stream = self.source.stream(self.split)
+        if self.shuffle_buffer:
+            # Same seed on every rank so shards are shuffled consistently.
+            stream = stream.shuffle(
+                seed=self.seed + self.epoch, buffer_size=self.shuffle_buffer
+            )
+        if self.size is None:
+            # Whole files are dealt out to ranks when they divide evenly.
+            stream = split_dataset_by_node(stream, self.rank, self.num_replicas)
+        else:
+            stream = stream.take(self.size)
+
+        # Batched reads skip the datasets library's own worker sharding;
+        # striding below splits the examples instead.
+        rows = (
+            (text, summary)
+            for batch in stream.iter(batch_size=256)
+            for text, summary in zip(
+                batch[self.source.text_field], batch[self.source.summary_field]
+            )
+        )
+        if self.size is not None:
+            rows = _exactly(
+                islice(
+                    rows, self.rank, len(self) * self.num_replicas, self.num_replicas
+                ),
+                len(self),
+                f"{self.split} split",
+            )
+        if worker is not None:
+            rows = _stride_batches(rows, self.batch_size, worker.id, worker.num_workers)
+
+        for text, summary in rows:
+            metrics.inc("dataset_items_total")
+            with metrics.timer("dataset_getitem_seconds"):
+                example = encode_example(self.tokenizer, text, summary, self.padding)
+            yield example
+
+
+def _exactly(rows, count, name):
+    # A rank that runs short would take fewer steps than the others and hang
+    # the gradient all-reduce, so it fails instead.
+    seen = 0
+    for row in rows:
+        seen += 1
+        yield row
+    if seen < count:
+        raise RuntimeError(f"The {name} ran out after {seen} of {count} rows")
+
+
+def _stride_batches(rows, batch_size, start, step):
+    """Every ``step``-th run of ``batch_size`` rows, beginning at run ``start``."""
+    for i, row in enumerate(rows):
+        if i // batch_size % step == start:
+            yield row
+
+
+def collate_batch(features, pad_token_id):
+    """Pad a list of unpadded examples to the longest sequence in the batch."""
+
+    def pad(key, value):
+        sequences = [feature[key] for feature in features]
+        return torch.nn.utils.rnn.pad_sequence(
+            sequences, batch_first=True, padding_value=value
+        )
+
+    return {
+        "input_ids": pad("input_ids", pad_token_id),
+        "attention_mask": pad("attention_mask", 0),
+        "labels": pad("labels", -100),
+    }
+
+
+class LengthGroupedBatchSampler(torch.utils.data.Sampler):
+    """Shuffled batches whose members have similar lengths.
 
-    val_dataset = SummarizerDataset(
-        dataset["validation"].select(range(val_size)),
+    Indices are shuffled, split into mega-batches of ``batch_size *
+    mega_batch_mult``, sorted by length inside each mega-batch and cut into
+    batches. The batch order is shuffled again, so every epoch stays random
+    while padding within a batch stays small. With ``num_replicas > 1``
+    every rank builds the same batches and takes an equal-sized share.
+    """
+
+    def __init__(
+        self,
+        lengths,
+        batch_size,
+        mega_batch_mult=50,
+        seed=0,
+        num_replicas=1,
+        rank=0,
+    ):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.mega_batch_size = batch_size * mega_batch_mult
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def batches(self):
+        rng = random.Random(self.seed + self.epoch)
+        indices = list(range(len(self.lengths)))
+        rng.shuffle(indices)
+
+        batches = []
+        for start in range(0, len(indices), self.mega_batch_size):
+            mega_batch = sorted(
+                indices[start : start + self.mega_batch_size],
+                key=lambda i: self.lengths[i],
+                reverse=True,
+            )
+            batches.extend(
+                mega_batch[i : i + self.batch_size]
+                for i in range(0, len(mega_batch), self.batch_size)
+            )
+        rng.shuffle(batches)
+        usable = len(batches) // self.num_replicas * self.num_replicas
+        return batches[self.rank : usable : self.num_replicas]
+
+    def __iter__(self):
+        batches = self.batches()
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self):
+        num_batches = (len(self.lengths) + self.batch_size - 1) // self.batch_size
+        return num_batches // self.num_replicas
+
+
+def padding_report(lengths, batch_size, seed=0):
+    """Pad tokens per epoch spent on inputs under each batching mode."""
+    rng = random.Random(seed)
+    shuffled = list(range(len(lengths)))
+    rng.shuffle(shuffled)
+    random_batches = [
+        shuffled[i : i + batch_size] for i in range(0, len(shuffled), batch_size)
+    ]
+    grouped_batches = LengthGroupedBatchSampler(lengths, batch_size, seed=seed)
+
+    def pad_tokens(batches):
+        return sum(
+            len(batch) * max(lengths[i] for i in batch) - sum(lengths[i] for i in batch)
+            for batch in batches
+        )
+
+    report = {
+        "real_tokens": sum(lengths),
+        "max_length": sum(MAX_INPUT_LENGTH - length for length in lengths),
+        "dynamic": pad_tokens(random_batches),
+        "dynamic_grouped": pad_tokens(grouped_batches.batches()),
+    }
+    for mode in ["max_length", "dynamic", "dynamic_grouped"]:
+        saved = report["max_length"] - report[mode]
+        print(f"🧮 {mode}: {report[mode]:,} pad tokens/epoch ({saved:,} saved)")
+    return report
+
+
+def _cached_split(source, split, size, tokenizer, cache_dir, padding, num_proc):
+    spec = {
+        **source.identity(split),
+        "split": split,
+        "size": size,
+        "max_input_length": MAX_INPUT_LENGTH,
+        "max_label_length": MAX_LABEL_LENGTH,
+    }
+    return load_token_cache(
+        cache_dir,
+        spec,
+        partial(source.load, split, size),
         tokenizer,
-        text_field,
-        summary_field,
+        source.text_field,
+        source.summary_field,
+        padding=padding,
+        num_proc=num_proc,
     )
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size)
+
+def get_data_loaders(
+    dataset_name,
+    batch_size,
+    train_size,
+    val_size,
+    tokenizer,
+    padding="max_length",
+    group_by_length=False,
+    cache_dir=None,
+    num_proc=None,
+    num_replicas=1,
+    rank=0,
+    streaming=False,
+    num_workers=0,
+):
+    """Loaders for a registered dataset, a local path or a ``DatasetSource``.
+
+    With ``streaming`` the splits are read lazily and sharded across ranks
+    and workers instead of being loaded or cached up front.
+    """
+    source = get_source(dataset_name)
+    dynamic = padding == "dynamic"
+    item_padding = "do_not_pad" if dynamic else "max_length"
+    collate_fn = (
+        partial(collate_batch, pad_token_id=tokenizer.pad_token_id) if dynamic else None
+    )
+
+    if streaming:
+        if group_by_length:
+            raise ValueError("group_by_length needs every length up front")
+        # Every rank must get the same number of rows, so a size the corpus
+        # can't fill is refused on all ranks before training starts.
+        for split, size in [("train", train_size), ("validation", val_size)]:
+            available = None if size is None else source.count(split, size)
+            if available is not None and available < size:
+                raise ValueError(
+                    f"The {split} split has only {available} rows, fewer than "
+                    f"the requested {size}"
+                )
+        train_dataset, val_dataset = (
+            StreamingSummarizerDataset(
+                source,
+                split,
+                tokenizer,
+                item_padding,
+                size,
+                num_replicas,
+                rank,
+                shuffle_buffer=shuffle_buffer,
+                batch_size=batch_size,
+            )
+            for split, size, shuffle_buffer in [
+                ("train", train_size, 10000),
+                ("validation", val_size, 0),
+            ]
+        )
+        return tuple(
+            DataLoader(
+                dataset,
+                batch_size=batch_size,
+                collate_fn=collate_fn,
+                num_workers=num_workers,
+            )
+            for dataset in [train_dataset, val_dataset]
+        )
+
+    if cache_dir:
+        train_dataset, val_dataset = (
+            _cached_split(
+                source, split, size, tokenizer, cache_dir, item_padding, num_proc
+            )
+            for split, size in [("train", train_size), ("validation", val_size)]
+        )
+    else:
+        train_dataset, val_dataset = (
+            SummarizerDataset(
+                source.load(split, size),
+                tokenizer,
+                source.text_field,
+                source.summary_field,
+                item_padding,
+            )
+            for split, size in [("train", train_size), ("validation", val_size)]
+        )
+
+    if dynamic or group_by_length:
+        lengths = train_dataset.input_lengths()
+        if rank == 0:
+            padding_report(lengths, batch_size)
+
+    if group_by_length:
+        train_loader = DataLoader(
+            train_dataset,
+            batch_sampler=LengthGroupedBatchSampler(
+                lengths, batch_size, num_replicas=num_replicas, rank=rank
+            ),
+            collate_fn=collate_fn,
+            num_workers=num_workers,
+        )
+    else:
+        # DistributedSampler shuffles from seed + epoch, so the data order of
+        # any epoch can be replayed when resuming, even with a single process.
+        train_loader = DataLoader(
+            train_dataset,
+            batch_size=batch_size,
+            sampler=DistributedSampler(train_dataset, num_replicas, rank),
+            collate_fn=collate_fn,
+            num_workers=num_workers,
+        )
+
+    # Each rank evaluates a disjoint strided share of the validation set.
+    val_loader = DataLoader(
+        val_dataset,
+        batch_size=batch_size,
+        sampler=range(rank, len(val_dataset), num_replicas),
+        collate_fn=collate_fn,
+        num_workers=num_workers,
+    )
 
     return train_loader, val_loader
@@ -0,0 +1,131 @@
+import glob
+import os
+
+from datasets import Dataset, load_dataset
+
+# Builder name per local file extension.
+LOCAL_FORMATS = {
+    ".jsonl": "json",
+    ".json": "json",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+}
+
+
+class DatasetSource:
+    """A hub dataset or local JSONL/Parquet/Arrow files with their fields.
+
+    Local paths may contain a ``{split}`` placeholder and glob patterns,
+    e.g. ``data/{split}-*.parquet``. A directory is read as
+    ``<directory>/<split>*``; a plain file serves every split.
+    """
+
+    def __init__(
+        self, path, version=None, text_field="text", summary_field="summary", name=None
+    ):
+        self.path = path
+        self.version = version
+        self.text_field = text_field
+        self.summary_field = summary_field
+        self.local = os.path.exists(path) or "{split}" in path or "*" in path
+        self.name = name or _slug(path)
+
+    def files(self, split):
+        pattern = self.path.format(split=split)
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, f"{split}*")
+        files = sorted(
+            path
+            for path in glob.glob(pattern)
+            if os.path.splitext(path)[1] in LOCAL_FORMATS
+        )
+        if not files:
+            raise FileNotFoundError(f"No {split} files match {pattern}")
+        return files
+
+    def has_split(self, split):
+        try:
+            return not self.local or bool(self.files(split))
+        except FileNotFoundError:
+            return False
+
+    def _load(self, split, **kwargs):
+        if not self.local:
+            if self.version:
+                return load_dataset(self.path, self.version, split=split, **kwargs)
+            return load_dataset(self.path, split=split, **kwargs)
+        files = self.files(split)
+        builder = LOCAL_FORMATS[os.path.splitext(files[0])[1]]
+        return load_dataset(builder, data_files=files, split="train", **kwargs)
+
+    def load(self, split, size=None):
+        """A map-style dataset holding the first ``size`` examples."""
+        if size is None:
+            return self._load(split)
+        if not self.local:
+            # Hub downloads are cached whole; slicing avoids a second copy.
+            return self._load(f"{split}[:{size}]")
+        # Local corpora are streamed so only ``size`` rows are ever read.
+        rows = list(self.stream(split).take(size))
+        return Dataset.from_list(rows)
+
+    def stream(self, split):
+        return self._load(split, streaming=True)
+
+    def count(self, split, limit=None):
+        """Rows in ``split``, counting no further than ``limit``."""
+        stream = self.stream(split)
+        splits = None if self.local else stream.info.splits
+        if splits and split in splits and splits[split].num_examples:
+            total = splits[split].num_examples
+            return total if limit is None else min(total, limit)
+        if limit is not None:
+            stream = stream.take(limit)
+        stream = stream.select_columns([self.text_field])
+        return sum(
+            len(batch[self.text_field]) for batch in stream.iter(batch_size=1024)
+        )
+
+    def identity(self, split):
+        """What a token cache built from ``split`` depends on."""
+        if not self.local:
+            return {"dataset": self.path, "version": self.version}
+        return {
+            "dataset": self.path,
+            "files": [
+                [path, os.path.getsize(path), os.stat(path).st_mtime_ns]
+                for path in self.files(split)
+            ],
+        }
+
+
+def _slug(path):
+    base = os.path.basename(path.rstrip("/"))
+    for token in ["{split}", "*", "?"]:
+        base = base.replace(token, "")
+    return os.path.splitext(base)[0].strip("-_.") or "local"
+
+
+DATASET_CONFIGS = {
+    "xsum": DatasetSource(
+        "EdinburghNLP/xsum", None, "document", "summary", name="xsum"
+    ),
+    "cnn_dailymail": DatasetSource(
+        "abisee/cnn_dailymail", "3.0.0", "article", "highlights", name="cnn_dailymail"
+    ),
+}
+
+
+def get_source(dataset, text_field="text", summary_field="summary"):
+    """Look up a registered dataset, or wrap a local path."""
+    if isinstance(dataset, DatasetSource):
+        return dataset
+    if dataset in DATASET_CONFIGS:
+        return DATASET_CONFIGS[dataset]
+    source = DatasetSource(dataset, text_field=text_field, summary_field=summary_field)
+    if not source.local:
+        raise ValueError(
+            f"Unknown dataset {dataset!r}: expected one of {list(DATASET_CONFIGS)} "
+            "or a local JSONL/Parquet/Arrow path"
+        )
+    return source
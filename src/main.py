@@ -1,73 +1,205 @@
+import argparse
 import json
 import os
-import sys
-
-from datasets import load_dataset
+from functools import partial
 
 from src.data.dataio import get_data_loaders
+from src.data.sources import get_source
 from src.model.model import SummarizerModel
-from src.train.train import train_model
+from src.train.checkpoint import CheckpointManager
+from src.train.distributed import (
+    get_rank,
+    get_world_size,
+    init_distributed,
+    is_main_process,
+    launch,
+    main_process_first,
+)
+from src.train.train import OPTIMIZERS, log, train_model
+from src.utils import metrics
 from src.utils.utils import plot_training_curves
 
-DATASET_CONFIGS = {
-    "xsum": ("EdinburghNLP/xsum", None, "document", "summary"),
-    "cnn_dailymail": ("abisee/cnn_dailymail", "3.0.0", "article", "highlights"),
-}
-
 
-def generate_examples(model, dataset_name, num_examples=3):
-    path, version, text_field, summary_field = DATASET_CONFIGS[dataset_name]
-    dataset = (
-        load_dataset(path, version, split="test")
-        if version
-        else load_dataset(path, split="test")
-    )
-
-    examples = []
-    for i in range(num_examples):
-        text = dataset[i][text_field]
-        examples.append(
-            {
-                "text": text,
-                "reference": dataset[i][summary_field],
-                "prediction": model.generate_summary(text),
-            }
-        )
-    return examples
+def generate_examples(model, source, num_examples=3):
+    # Streaming reads just the first rows instead of the whole split.
+    split = "test" if source.has_split("test") else "validation"
+    rows = list(source.stream(split).take(num_examples))
+    texts = [row[source.text_field] for row in rows]
+    references = [row[source.summary_field] for row in rows]
+    predictions = model.generate_summaries(texts)
+    return [
+        {"text": text, "reference": reference, "prediction": prediction}
+        for text, reference, prediction in zip(texts, references, predictions)
+    ]
 
 
 def train_dataset(
-    dataset_name, train_size=30000, val_size=1000, batch_size=16, epochs=5
+    dataset_name,
+    train_size=30000,
+    val_size=1000,
+    batch_size=16,
+    epochs=5,
+    padding="max_length",
+    group_by_length=False,
+    cache_dir="cache/tokens",
+    eval_batches=8,
+    grad_accum_steps=1,
+    bf16=False,
+    compile_model=False,
+    gradient_checkpointing=False,
+    optimizer_impl="default",
+    checkpoint_every=500,
+    keep_checkpoints=3,
+    resume=None,
+    profile_start=10,
+    profile_steps=0,
+    text_field="text",
+    summary_field="summary",
+    streaming=False,
+    num_workers=0,
 ):
-    print(f"\n🚀 Training on {dataset_name.upper()}")
-    print(f"📊 {train_size} train samples, batch_size={batch_size}, epochs={epochs}")
-
-    model = SummarizerModel()
-    train_loader, val_loader = get_data_loaders(
-        dataset_name, batch_size, train_size, val_size, model.tokenizer
+    source = get_source(dataset_name, text_field, summary_field)
+    dataset_name = source.name
+    log(f"\n🚀 Training on {dataset_name.upper()}")
+    log(f"📊 {train_size} train samples, batch_size={batch_size}, epochs={epochs}")
+
+    with main_process_first():
+        model = SummarizerModel()
+        train_loader, val_loader = get_data_loaders(
+            source,
+            batch_size,
+            train_size,
+            val_size,
+            model.tokenizer,
+            padding=padding,
+            group_by_length=group_by_length,
+            cache_dir=cache_dir,
+            num_proc=os.cpu_count(),
+            num_replicas=get_world_size(),
+            rank=get_rank(),
+            streaming=streaming,
+            num_workers=num_workers,
+        )
+    checkpoint_dir = f"checkpoints/{dataset_name}"
+    if resume == "auto":
+        resume = CheckpointManager(checkpoint_dir).latest()
+    model, history = train_model(
+        model,
+        train_loader,
+        val_loader,
+        epochs,
+        dataset_name,
+        eval_batches=eval_batches,
+        grad_accum_steps=grad_accum_steps,
+        bf16=bf16,
+        compile_model=compile_model,
+        gradient_checkpointing=gradient_checkpointing,
+        optimizer_impl=optimizer_impl,
+        checkpoint_dir=checkpoint_dir,
+        checkpoint_every=checkpoint_every,
+        keep_checkpoints=keep_checkpoints,
+        resume_from=resume,
+        profile_start=profile_start,
+        profile_steps=profile_steps,
     )
-    model, history = train_model(model, train_loader, val_loader, epochs, dataset_name)
 
-    examples = generate_examples(model, dataset_name)
+    if not is_main_process():
+        return
+    examples = generate_examples(model, source)
     os.makedirs("results", exist_ok=True)
     with open(f"results/{dataset_name}_examples.json", "w") as f:
         json.dump(examples, f, indent=2)
     plot_training_curves(dataset_name)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train T5 summarizers")
+    parser.add_argument(
+        "dataset",
+        nargs="?",
+        default=None,
+        help="xsum, cnn, or a local JSONL/Parquet/Arrow path (may use {split})",
+    )
+    parser.add_argument("--text-field", default="text", help="for local files")
+    parser.add_argument("--summary-field", default="summary", help="for local files")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="read splits lazily instead of loading and caching them",
+    )
+    parser.add_argument("--num-workers", type=int, default=0)
+    parser.add_argument("--train-size", type=int, default=30000)
+    parser.add_argument("--val-size", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument(
+        "--padding", choices=["max_length", "dynamic"], default="max_length"
+    )
+    parser.add_argument("--group-by-length", action="store_true")
+    parser.add_argument("--grad-accum-steps", type=int, default=1)
+    parser.add_argument("--bf16", action="store_true")
+    parser.add_argument("--compile", dest="compile_model", action="store_true")
+    parser.add_argument("--gradient-checkpointing", action="store_true")
+    parser.add_argument(
+        "--optimizer", dest="optimizer_impl", choices=OPTIMIZERS, default="default"
+    )
+    parser.add_argument(
+        "--checkpoint-every", type=int, default=500, help="optimizer steps"
+    )
+    parser.add_argument("--keep-checkpoints", type=int, default=3)
+    parser.add_argument(
+        "--resume",
+        default=None,
+        help="training checkpoint to continue from, or 'auto' for the latest",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="record per-stage timings to results/{dataset}_metrics.json",
+    )
+    parser.add_argument("--profile-start", type=int, default=10)
+    parser.add_argument(
+        "--profile-steps",
+        type=int,
+        default=0,
+        help="trace this many steps with torch.profiler",
+    )
+    parser.add_argument(
+        "--nproc", type=int, default=1, help="local data-parallel worker processes"
+    )
+    return parser.parse_args()
+
+
 def main():
     print("📝 T5 Text Summarizer Training")
-    dataset = sys.argv[1].lower() if len(sys.argv) > 1 else None
+    args = parse_args()
+    options = {
+        k: v for k, v in vars(args).items() if k not in ["dataset", "nproc", "metrics"]
+    }
+    dataset = args.dataset.lower() if args.dataset else None
+
+    if args.metrics:
+        metrics.enable()
+
+    # Under torchrun the process group comes from the environment; --nproc
+    # spawns local gloo workers instead.
+    init_distributed()
+    if args.nproc > 1:
+        run = partial(launch, train_dataset, args.nproc)
+    else:
+        run = train_dataset
 
     if dataset in ["xsum", "cnn"]:
         dataset_name = "xsum" if dataset == "xsum" else "cnn_dailymail"
-        train_dataset(dataset_name)
+        run(dataset_name, **options)
+    elif args.dataset:
+        run(args.dataset, **options)
     else:
-        print("🎯 Training on both datasets")
-        train_dataset("xsum")
-        train_dataset("cnn_dailymail")
+        log("🎯 Training on both datasets")
+        run("xsum", **options)
+        run("cnn_dailymail", **options)
 
-    print("\n✅ Training completed!")
+    log("\n✅ Training completed!")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+
+import torch
+from torch import nn
+
+BACKENDS = ["eager", "int8", "onnx"]
+
+# Written next to an ONNX export to record which checkpoint it came from.
+SOURCE_FILE = "source.json"
+
+
+def export_dir_for(path):
+    return f"{os.path.splitext(path)[0]}_onnx"
+
+
+def quantize_int8(model):
+    """Dynamically quantize every ``nn.Linear`` to int8 weights, in place."""
+    return torch.ao.quantization.quantize_dynamic(
+        model, {nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def read_source(export_dir):
+    path = os.path.join(export_dir, SOURCE_FILE)
+    try:
+        with open(path, encoding="utf-8") as file_handle:
+            return json.load(file_handle).get("checkpoint")
+    except (OSError, ValueError):
+        return None
+
+
+def export_onnx(model, tokenizer, export_dir, checkpoint=None):
+    # pylint: disable=import-outside-toplevel
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        model.save_pretrained(checkpoint_dir)
+        tokenizer.save_pretrained(checkpoint_dir)
+        ort_model = ORTModelForSeq2SeqLM.from_pretrained(checkpoint_dir, export=True)
+    ort_model.save_pretrained(export_dir)
+    path = os.path.join(export_dir, SOURCE_FILE)
+    with open(path, "w", encoding="utf-8") as file_handle:
+        json.dump({"checkpoint": checkpoint}, file_handle)
+    return ort_model
+
+
+def load_onnx(model, tokenizer, export_dir, checkpoint=None):
+    try:
+        # pylint: disable=import-outside-toplevel
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as error:
+        raise RuntimeError(
+            "The onnx backend needs optimum[onnxruntime] to be installed"
+        ) from error
+
+    if checkpoint is not None and read_source(export_dir) == checkpoint:
+        return ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+    return export_onnx(model, tokenizer, export_dir, checkpoint)
+
+
+def load_backend(model, tokenizer, backend, export_dir=None, checkpoint=None):
+    """Return the object whose ``generate`` serves ``backend``.
+
+    ``eager`` and ``int8`` run the torch model (int8 replaces its linear
+    layers in place); ``onnx`` runs an ONNX Runtime export, reusing
+    ``export_dir`` only when it was exported from ``checkpoint`` and
+    re-exporting it otherwise.
+    """
+    if backend == "eager":
+        return model
+    if backend == "int8":
+        return quantize_int8(model)
+    if backend == "onnx":
+        export_dir = export_dir or tempfile.mkdtemp()
+        return load_onnx(model, tokenizer, export_dir, checkpoint)
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class SummaryCache:
+    """LRU cache of generated summaries with an optional on-disk store.
+
+    Keys are content addresses: a hash of the whitespace-normalized text,
+    the model's checkpoint identity and the generation parameters. Disk
+    entries survive restarts and are promoted into memory on first hit. The
+    store holds at most ``max_disk_entries`` files; the least recently used
+    are deleted first, which also retires entries of replaced checkpoints.
+    """
+
+    def __init__(self, max_entries=1024, cache_dir=None, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.disk = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "disk_evictions": 0}
+        self.lock = threading.Lock()
+        if cache_dir and os.path.isdir(cache_dir):
+            self._scan()
+
+    def _scan(self):
+        # Modification times order existing files, since hits touch them.
+        files = []
+        for directory in os.scandir(self.cache_dir):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(".json"):
+                    files.append((entry.stat().st_mtime_ns, entry.name[:-5]))
+        for _, key in sorted(files):
+            self.disk[key] = None
+        self._evict_disk()
+
+    def _touch_disk(self, key):
+        self.disk[key] = None
+        self.disk.move_to_end(key)
+
+    def _evict_disk(self):
+        while len(self.disk) > self.max_disk_entries:
+            key, _ = self.disk.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self.stats["disk_evictions"] += 1
+
+    @staticmethod
+    def key(text, model_id, params):
+        normalized = " ".join(text.split())
+        payload = json.dumps([normalized, model_id, params], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key, summary):
+        self.entries[key] = summary
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self.entries[key]
+
+            if self.cache_dir and os.path.exists(self._path(key)):
+                with open(self._path(key), encoding="utf-8") as file_handle:
+                    summary = json.load(file_handle)["summary"]
+                os.utime(self._path(key))
+                self._touch_disk(key)
+                self._remember(key, summary)
+                self.stats["hits"] += 1
+                return summary
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, summary):
+        with self.lock:
+            self._remember(key, summary)
+
+        if self.cache_dir:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "w", encoding="utf-8") as file_handle:
+                json.dump({"summary": summary}, file_handle)
+            os.replace(tmp_path, path)
+            with self.lock:
+                self._touch_disk(key)
+                self._evict_disk()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class EncoderCache:
+    """Small LRU of encoder outputs so one input can be decoded many ways.
+
+    Entries hold full hidden states, so the cache is kept in memory only
+    and bounded to a handful of recent inputs.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import torch
+from safetensors.torch import save_file
+
+from src.data.sources import DATASET_CONFIGS, get_source
+from src.model.backends import BACKENDS, export_dir_for
+from src.model.model import SummarizerModel
+from src.utils.utils import compute_rouge
+
+
+def to_safetensors(path, model_name="t5-small"):
+    model = SummarizerModel(model_name, pretrained=False)
+    model.load_checkpoint(path)
+
+    # Tied embeddings are stored once under model.shared.weight and re-tied
+    # by SummarizerModel.load_checkpoint.
+    shared = model.model.shared.weight.data_ptr()
+    state_dict = {
+        name: tensor.contiguous()
+        for name, tensor in model.state_dict().items()
+        if name == "model.shared.weight" or tensor.data_ptr() != shared
+    }
+    output_path = f"{os.path.splitext(path)[0]}.safetensors"
+    save_file(state_dict, output_path)
+    print(f"💾 Saved {output_path}")
+    return output_path
+
+
+def measure_backend(path, backend, texts):
+    """Latency, peak RSS and predictions of ``backend`` in this process."""
+    model = SummarizerModel(pretrained=False)
+    model.load_checkpoint(path)
+    model.set_backend(backend, export_dir_for(path))
+
+    start = time.perf_counter()
+    predictions = model.generate_summaries(texts)
+    elapsed = time.perf_counter() - start
+    return {
+        "backend": backend,
+        "ms_per_doc": elapsed / len(texts) * 1000,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "predictions": predictions,
+    }
+
+
+def compare_backends(path, backends, dataset_name, num_examples=32):
+    """Convert ``path`` to every backend and score it on a validation slice."""
+    source = get_source(dataset_name)
+    examples = source.load("validation", num_examples)
+    texts = examples[source.text_field]
+    references = examples[source.summary_field]
+
+    if "onnx" in backends:
+        # Export up front so the measured run only loads it.
+        model = SummarizerModel(pretrained=False)
+        model.load_checkpoint(path)
+        model.set_backend("onnx", export_dir_for(path))
+        del model
+
+    report = []
+    with tempfile.TemporaryDirectory() as tmp_directory:
+        texts_path = os.path.join(tmp_directory, "texts.json")
+        with open(texts_path, "w", encoding="utf-8") as file_handle:
+            json.dump(texts, file_handle)
+
+        for backend in ["eager"] + [name for name in backends if name != "eager"]:
+            # Each backend runs in a fresh interpreter so its peak resident
+            # memory covers only its own load and generate.
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "src.model.convert",
+                    path,
+                    "--measure",
+                    backend,
+                    "--texts",
+                    texts_path,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            scores = compute_rouge(row.pop("predictions"), references)
+            row.update({key: scores[key] for key in ["rouge1", "rouge2", "rougeL"]})
+            report.append(row)
+
+    baseline = report[0]
+    for row in report:
+        row["rougeL_delta"] = row["rougeL"] - baseline["rougeL"]
+        print(
+            f"⚙️ {row['backend']}: {row['ms_per_doc']:.0f} ms/doc, "
+            f"{row['max_rss_mb']:.0f} MB peak RSS, ROUGE-L {row['rougeL']:.3f} "
+            f"({row['rougeL_delta']:+.3f})"
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert .pth checkpoints")
+    parser.add_argument("checkpoints", nargs="+")
+    parser.add_argument(
+        "--backends",
+        nargs="*",
+        default=[],
+        choices=BACKENDS,
+        help="also export to these backends and compare them on validation data",
+    )
+    parser.add_argument("--dataset", choices=list(DATASET_CONFIGS), default=None)
+    parser.add_argument("--num-examples", type=int, default=32)
+    parser.add_argument("--measure", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--texts", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        with open(args.texts, encoding="utf-8") as file_handle:
+            texts = json.load(file_handle)
+        print(json.dumps(measure_backend(args.checkpoints[0], args.measure, texts)))
+        return
+
+    for path in args.checkpoints:
+        to_safetensors(path)
+        if not args.backends:
+            continue
+
+        dataset_name = args.dataset or next(
+            name for name in DATASET_CONFIGS if os.path.basename(path).startswith(name)
+        )
+        report = compare_backends(path, args.backends, dataset_name, args.num_examples)
+        report_path = f"{os.path.splitext(path)[0]}_backends.json"
+        with open(report_path, "w", encoding="utf-8") as file_handle:
+            json.dump(report, file_handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import re
+import time
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+REDUCE_STRATEGIES = ["none", "summarize"]
+
+
+def _split_long_sentence(sentence, tokenizer, chunk_size):
+    words = sentence.split()
+    lengths = [len(ids) for ids in tokenizer(words, add_special_tokens=False).input_ids]
+    pieces, piece, tokens = [], [], 0
+    for word, length in zip(words, lengths):
+        if piece and tokens + length > chunk_size:
+            pieces.append((" ".join(piece), tokens))
+            piece, tokens = [], 0
+        piece.append(word)
+        tokens += length
+    if piece:
+        pieces.append((" ".join(piece), tokens))
+    return pieces
+
+
+def split_windows(text, tokenizer, chunk_size=480, overlap=64):
+    """Split ``text`` into sentence-aligned windows of at most ``chunk_size``.
+
+    Consecutive windows repeat trailing sentences worth up to ``overlap``
+    tokens, so content at a boundary is seen with some context. Sentences
+    longer than ``overlap`` (or than a window, without overlap) are cut at
+    word boundaries into pieces that fit, so every boundary has a tail to
+    repeat even in unpunctuated text.
+    """
+    sentences = [s for s in SENTENCE_BOUNDARY.split(text.strip()) if s]
+    if not sentences:
+        return []
+    lengths = [
+        len(ids) for ids in tokenizer(sentences, add_special_tokens=False).input_ids
+    ]
+
+    piece_size = min(overlap, chunk_size) if overlap > 0 else chunk_size
+    units = []
+    for sentence, length in zip(sentences, lengths):
+        if length > piece_size:
+            units.extend(_split_long_sentence(sentence, tokenizer, piece_size))
+        else:
+            units.append((sentence, length))
+
+    windows, start = [], 0
+    while start < len(units):
+        end, tokens = start, 0
+        while end < len(units) and (
+            end == start or tokens + units[end][1] <= chunk_size
+        ):
+            tokens += units[end][1]
+            end += 1
+        windows.append(" ".join(sentence for sentence, _ in units[start:end]))
+        if end == len(units):
+            break
+
+        next_start, carried = end, 0
+        while next_start - 1 > start and carried + units[next_start - 1][1] <= overlap:
+            next_start -= 1
+            carried += units[next_start][1]
+        start = next_start
+    return windows
+
+
+def summarize_long(
+    model,
+    text,
+    chunk_size=480,
+    overlap=64,
+    reduce="summarize",
+    max_length=150,
+    num_beams=4,
+    max_rounds=3,
+):
+    """Map-reduce summarization for inputs longer than the encoder window.
+
+    The map stage summarizes every window in one batched
+    ``generate_summaries`` call. With ``reduce="summarize"`` the joined
+    partial summaries are summarized again, re-windowing them for up to
+    ``max_rounds`` rounds while they still exceed ``chunk_size`` tokens.
+    """
+    if reduce not in REDUCE_STRATEGIES:
+        raise ValueError(f"Unknown reduce strategy {reduce!r}")
+    timings = {}
+
+    start = time.perf_counter()
+    windows = split_windows(text, model.tokenizer, chunk_size, overlap)
+    timings["split"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    partials = model.generate_summaries(windows, max_length, num_beams)
+    timings["map"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = " ".join(partials)
+    if reduce == "summarize" and len(partials) > 1:
+        for _ in range(max_rounds):
+            reduce_windows = split_windows(summary, model.tokenizer, chunk_size, 0)
+            if len(reduce_windows) <= 1:
+                break
+            summary = " ".join(
+                model.generate_summaries(reduce_windows, max_length, num_beams)
+            )
+        summary = model.generate_summary(summary, max_length, num_beams)
+    timings["reduce"] = time.perf_counter() - start
+
+    return {
+        "summary": summary,
+        "partials": partials,
+        "num_windows": len(windows),
+        "timings": timings,
+    }
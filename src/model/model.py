@@ -1,28 +1,281 @@
+import os
+
 import torch
+from safetensors.torch import load_file
 from torch import nn
-from transformers import AutoTokenizer, T5ForConditionalGeneration
+from transformers import AutoTokenizer, T5Config, T5ForConditionalGeneration
+from transformers.modeling_outputs import BaseModelOutput
+
+from src.model.backends import load_backend
+from src.model.cache import EncoderCache, SummaryCache
+from src.model.longdoc import summarize_long
+from src.utils import metrics
+
+# Generation settings a variant may override.
+VARIANT_KEYS = ["max_length", "num_beams"]
+
+
+def pack_batches(lengths, max_batch_tokens, max_batch_size=None):
+    """Group indices sorted by decreasing length into padded micro-batches.
+
+    A batch is closed once adding the next item would make its padded size
+    (items x longest item) exceed ``max_batch_tokens``.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches, batch = [], []
+    for idx in order:
+        longest = lengths[batch[0]] if batch else lengths[idx]
+        full = max_batch_size is not None and len(batch) >= max_batch_size
+        if batch and (full or (len(batch) + 1) * longest > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(idx)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def resolve_checkpoint(path):
+    """Prefer a converted ``.safetensors`` file next to a ``.pth`` checkpoint."""
+    safetensors_path = f"{os.path.splitext(path)[0]}.safetensors"
+    return safetensors_path if os.path.exists(safetensors_path) else path
+
+
+def load_weights(path):
+    """Load a state dict from ``.safetensors`` or ``.pth`` without copying.
+
+    ``.pth`` files are memory-mapped by ``torch.load``, so weights are paged
+    in from disk instead of being read into a second buffer first.
+    """
+    if path.endswith(".safetensors"):
+        return load_file(path)
+    return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
 
 
 class SummarizerModel(nn.Module):
-    def __init__(self, model_name="t5-small"):
+    def __init__(
+        self, model_name="t5-small", tokenizer=None, pretrained=True, config=None
+    ):
         super().__init__()
-        self.model = T5ForConditionalGeneration.from_pretrained(model_name)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if config is not None:
+            # Randomly initialized from an explicit config; needs no download.
+            self.model = T5ForConditionalGeneration(config)
+        elif pretrained:
+            self.model = T5ForConditionalGeneration.from_pretrained(model_name)
+        else:
+            # Skeleton only: weights stay on the meta device until a checkpoint
+            # is loaded, so nothing is allocated or initialized twice.
+            with torch.device("meta"):
+                self.model = T5ForConditionalGeneration(
+                    T5Config.from_pretrained(model_name)
+                )
+            self.model.eval()
+        self.tokenizer = tokenizer or AutoTokenizer.from_pretrained(model_name)
+        self.checkpoint = model_name
+        self.cache = None
+        self.encoder_cache = EncoderCache()
+        self.backend = "eager"
+        self.runtime = None
 
         self.device = torch.device(
             "mps" if torch.backends.mps.is_available() else "cpu"
         )
         print(f"Using device: {self.device}")
+        if pretrained or config is not None:
+            self.model.to(self.device)
+        metrics.instrument(self.model.get_encoder(), "encoder_seconds")
+
+    def load_checkpoint(self, path):
+        # safetensors files store tied embeddings once, so missing keys are
+        # filled in by tie_weights and anything left on meta is an error.
+        result = self.load_state_dict(load_weights(path), strict=False, assign=True)
+        self.model.tie_weights()
+        missing = [name for name, param in self.named_parameters() if param.is_meta]
+        if missing or result.unexpected_keys:
+            raise RuntimeError(
+                f"Checkpoint {path} does not match the model: "
+                f"missing {missing}, unexpected {result.unexpected_keys}"
+            )
         self.model.to(self.device)
+        stat = os.stat(path)
+        self.checkpoint = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        # ``cache`` may be shared with other models; its keys already carry
+        # the checkpoint and backend, so it is never cleared here.
+        self.encoder_cache.clear()
 
-    def generate_summary(self, text):
-        input_ids = self.tokenizer(
-            f"summarize: {text}", return_tensors="pt", max_length=512, truncation=True
-        ).input_ids.to(self.device)
-        output_ids = self.model.generate(
-            input_ids, max_length=150, num_beams=4, early_stopping=True
+    def set_backend(self, backend, export_dir=None):
+        if self.backend == "int8" and backend != "int8":
+            raise ValueError(
+                "int8 quantizes the model in place and can't be undone; "
+                "load the checkpoint into a new SummarizerModel instead"
+            )
+        if backend != "eager":
+            # Quantized and exported backends are CPU-only.
+            self.device = torch.device("cpu")
+            self.model.to(self.device)
+        generator = load_backend(
+            self.model, self.tokenizer, backend, export_dir, self.checkpoint
         )
-        return self.tokenizer.decode(output_ids[0], skip_special_tokens=True)
+        self.runtime = None if generator is self.model else generator
+        self.backend = backend
+        self.encoder_cache.clear()
+
+    def summarize_long(self, text, **kwargs):
+        return summarize_long(self, text, **kwargs)
+
+    def generate_summary(self, text, max_length=150, num_beams=4):
+        return self.generate_summaries([text], max_length, num_beams)[0]
+
+    def generate_summaries(
+        self,
+        texts,
+        max_length=150,
+        num_beams=4,
+        max_batch_tokens=8192,
+        max_batch_size=None,
+    ):
+        if self.cache is None:
+            return self._generate(
+                texts, max_length, num_beams, max_batch_tokens, max_batch_size
+            )
+
+        params = {
+            "max_length": max_length,
+            "num_beams": num_beams,
+            "backend": self.backend,
+        }
+        keys = [self.cache.key(text, self.checkpoint, params) for text in texts]
+        summaries = [self.cache.get(key) for key in keys]
+        misses = [i for i, summary in enumerate(summaries) if summary is None]
+        if misses:
+            generated = self._generate(
+                [texts[i] for i in misses],
+                max_length,
+                num_beams,
+                max_batch_tokens,
+                max_batch_size,
+            )
+            for i, summary in zip(misses, generated):
+                self.cache.put(keys[i], summary)
+                summaries[i] = summary
+        return summaries
+
+    def generate_variants(self, text, configs):
+        """Summaries of one text, one per generation config.
+
+        Each config holds ``max_length`` and ``num_beams``. The encoder runs
+        once and its output is shared by every config; recent encoder
+        outputs are also kept in ``encoder_cache`` for repeat requests.
+        """
+        for config in configs:
+            unknown = set(config) - set(VARIANT_KEYS)
+            if unknown:
+                raise ValueError(
+                    f"Unknown generation settings {sorted(unknown)}, "
+                    f"expected {VARIANT_KEYS}"
+                )
+        configs = [{"max_length": 150, "num_beams": 4, **config} for config in configs]
+        if self.runtime is not None:
+            # Exported runtimes run their own encoder inside generate().
+            return [self.generate_summaries([text], **config)[0] for config in configs]
+
+        summaries = [None] * len(configs)
+        keys = [None] * len(configs)
+        if self.cache is not None:
+            for i, config in enumerate(configs):
+                params = {**config, "backend": self.backend}
+                keys[i] = self.cache.key(text, self.checkpoint, params)
+                summaries[i] = self.cache.get(keys[i])
+        misses = [i for i, summary in enumerate(summaries) if summary is None]
+        if not misses:
+            return summaries
+
+        hidden_states, attention_mask = self._encode(text)
+        with torch.no_grad():
+            for i in misses:
+                # generate() expands encoder_outputs in place for beam
+                # search, so each call gets its own wrapper.
+                with metrics.timer("generate_search_seconds"):
+                    output_ids = self.model.generate(
+                        encoder_outputs=BaseModelOutput(
+                            last_hidden_state=hidden_states
+                        ),
+                        attention_mask=attention_mask,
+                        early_stopping=True,
+                        **configs[i],
+                    )
+                summaries[i] = self.tokenizer.decode(
+                    output_ids[0], skip_special_tokens=True
+                )
+                if self.cache is not None:
+                    self.cache.put(keys[i], summaries[i])
+        return summaries
+
+    def _encode(self, text):
+        key = SummaryCache.key(text, self.checkpoint, {"backend": self.backend})
+        cached = self.encoder_cache.get(key)
+        if cached is not None:
+            metrics.inc("encoder_cache_hits_total")
+            return cached
+
+        metrics.inc("encoder_cache_misses_total")
+        inputs = self.tokenizer(
+            f"summarize: {text}", max_length=512, truncation=True, return_tensors="pt"
+        ).to(self.device)
+        with torch.no_grad():
+            hidden_states = self.model.get_encoder()(
+                input_ids=inputs.input_ids, attention_mask=inputs.attention_mask
+            ).last_hidden_state
+        self.encoder_cache.put(key, (hidden_states, inputs.attention_mask))
+        return hidden_states, inputs.attention_mask
+
+    def _generate(self, texts, max_length, num_beams, max_batch_tokens, max_batch_size):
+        if not texts:
+            return []
+        with metrics.timer("generate_tokenize_seconds"):
+            input_ids = self.tokenizer(
+                [f"summarize: {text}" for text in texts],
+                max_length=512,
+                truncation=True,
+            ).input_ids
+        summaries = [None] * len(texts)
+        generator = self.model if self.runtime is None else self.runtime
+
+        with torch.no_grad():
+            for batch in pack_batches(
+                [len(ids) for ids in input_ids], max_batch_tokens, max_batch_size
+            ):
+                inputs = self.tokenizer.pad(
+                    {"input_ids": [input_ids[i] for i in batch]}, return_tensors="pt"
+                ).to(self.device)
+                # Includes the encoder pass, which is also timed on its own.
+                with metrics.timer("generate_search_seconds") as search:
+                    output_ids = generator.generate(
+                        input_ids=inputs.input_ids,
+                        attention_mask=inputs.attention_mask,
+                        max_length=max_length,
+                        num_beams=num_beams,
+                        early_stopping=True,
+                    )
+                with metrics.timer("generate_decode_seconds"):
+                    decoded = self.tokenizer.batch_decode(
+                        output_ids, skip_special_tokens=True
+                    )
+                for idx, summary in zip(batch, decoded):
+                    summaries[idx] = summary
+
+                if metrics.enabled():
+                    tokens_out = int((output_ids != self.tokenizer.pad_token_id).sum())
+                    metrics.inc("generate_sequences_total", len(batch))
+                    metrics.inc(
+                        "generate_tokens_in_total", int(inputs.attention_mask.sum())
+                    )
+                    metrics.inc("generate_tokens_out_total", tokens_out)
+                    metrics.observe(
+                        "generate_tokens_per_second", tokens_out / search.elapsed
+                    )
+
+        return summaries
 
     def forward(self, input_ids, attention_mask, labels):
         return self.model(
@@ -1,4 +1,4 @@
-import torch
+import sys
 
 from src.model.model import SummarizerModel
 
@@ -39,18 +39,19 @@ Have you been affected by flooding in Dumfries and Galloway or the Borders? Tell
 ]
 
 
-def test_model():
+def test_model(backend="eager"):
     for dataset in ["xsum", "cnn_dailymail"]:
         print(f"\nTesting {dataset} model:")
-        model = SummarizerModel("t5-small")
-        model.load_state_dict(torch.load(f"models/{dataset}_epoch_5.pth"))
+        model = SummarizerModel("t5-small", pretrained=False)
+        model.load_checkpoint(f"models/{dataset}_epoch_5.pth")
+        model.set_backend(backend, f"models/{dataset}_epoch_5_onnx")
 
-        for i, case in enumerate(TEST_CASES, 1):
-            summary = model.generate_summary(case["text"])
+        summaries = model.generate_summaries([case["text"] for case in TEST_CASES])
+        for i, (case, summary) in enumerate(zip(TEST_CASES, summaries), 1):
             print(f"\nTest {i}:")
             print(f"Expected: {case['expected']}")
             print(f"Got: {summary}")
 
 
 if __name__ == "__main__":
-    test_model()
+    test_model(sys.argv[1] if len(sys.argv) > 1 else "eager")
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+
+import torch
+
+
+def snapshot(obj):
+    """Deep-copy tensors in a (nested) state dict to CPU memory."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+class CheckpointManager:
+    """Save checkpoints on a background thread and rotate old ones out.
+
+    ``save`` snapshots the state on the caller's thread and returns while
+    the file is written, so training continues during serialization. After
+    each write only the last ``keep_last`` checkpoints are kept, plus the
+    one with the highest metric when ``keep_best`` is set.
+    """
+
+    def __init__(
+        self,
+        directory,
+        keep_last=3,
+        keep_best=True,
+        pattern="step_{step:08d}.pt",
+        index_name="index.json",
+    ):
+        self.directory = directory
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.pattern = pattern
+        self.index_path = os.path.join(directory, index_name)
+        self.thread = None
+        self.error = None
+
+        self.entries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as file_handle:
+                self.entries = json.load(file_handle)
+
+    def save(self, state, step, metric=None):
+        self.wait()
+        state = snapshot(state)
+        self.thread = threading.Thread(
+            target=self._write, args=(state, step, metric), daemon=False
+        )
+        self.thread.start()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _write(self, state, step, metric):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, self.pattern.format(step=step))
+            tmp_path = f"{path}.tmp"
+            torch.save(state, tmp_path)
+            os.replace(tmp_path, path)
+
+            self.entries = [entry for entry in self.entries if entry["path"] != path]
+            self.entries.append({"path": path, "step": step, "metric": metric})
+            self._rotate()
+        except Exception as error:  # pylint: disable=broad-except
+            self.error = error
+
+    def _rotate(self):
+        keep = {entry["path"] for entry in self.entries[-self.keep_last :]}
+        best = self.best()
+        if self.keep_best and best is not None:
+            keep.add(best["path"])
+
+        for entry in self.entries:
+            if entry["path"] not in keep and os.path.exists(entry["path"]):
+                os.remove(entry["path"])
+        self.entries = [entry for entry in self.entries if entry["path"] in keep]
+
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file_handle:
+            json.dump(self.entries, file_handle, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def best(self):
+        scored = [entry for entry in self.entries if entry["metric"] is not None]
+        return max(scored, key=lambda entry: entry["metric"]) if scored else None
+
+    def latest(self):
+        return self.entries[-1]["path"] if self.entries else None
@@ -0,0 +1,94 @@
+import os
+import socket
+from contextlib import contextmanager
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def init_distributed():
+    """Join the gloo process group described by torchrun-style env vars."""
+    if not is_distributed() and int(os.environ.get("WORLD_SIZE", "1")) > 1:
+        dist.init_process_group("gloo")
+        local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", get_world_size()))
+        torch.set_num_threads(max(os.cpu_count() // local_world_size, 1))
+    return is_distributed()
+
+
+@contextmanager
+def main_process_first():
+    """Let rank 0 download/tokenize first so other ranks hit warm caches."""
+    if not is_main_process():
+        dist.barrier()
+    yield
+    if is_main_process() and is_distributed():
+        dist.barrier()
+
+
+def gather_lists(items):
+    if not is_distributed():
+        return items
+    gathered = [None] * get_world_size()
+    dist.all_gather_object(gathered, items)
+    return [item for part in gathered for item in part]
+
+
+def all_reduce_sum(value):
+    if not is_distributed():
+        return value
+    tensor = torch.tensor(value, dtype=torch.float64)
+    dist.all_reduce(tensor)
+    return tensor.item()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _worker(rank, world_size, port, fn, args, kwargs):
+    os.environ.update(
+        {
+            "RANK": str(rank),
+            "LOCAL_RANK": str(rank),
+            "WORLD_SIZE": str(world_size),
+            "LOCAL_WORLD_SIZE": str(world_size),
+            "MASTER_ADDR": "127.0.0.1",
+            "MASTER_PORT": str(port),
+        }
+    )
+    init_distributed()
+    try:
+        fn(*args, **kwargs)
+    finally:
+        if is_distributed():
+            dist.destroy_process_group()
+
+
+def launch(fn, nproc, *args, **kwargs):
+    """Run ``fn`` in ``nproc`` local gloo workers, each with a CPU share.
+
+    For several hosts, start ``src.main`` with ``torchrun`` instead; it sets
+    the same environment variables and ``init_distributed`` picks them up.
+    """
+    mp.spawn(
+        _worker, args=(nproc, _free_port(), fn, args, kwargs), nprocs=nproc, join=True
+    )
@@ -1,67 +1,339 @@
 import json
+import math
 import os
+import random
+import resource
+import sys
+import time
+from contextlib import nullcontext
+from itertools import islice
 
+import numpy as np
 import torch
+from torch.nn.parallel import DistributedDataParallel
 from torch.optim import AdamW
+from torch.utils.data import DataLoader, IterableDataset
 from tqdm import tqdm
 from transformers import get_scheduler
 
+from src.train.checkpoint import CheckpointManager
+from src.train.distributed import (
+    all_reduce_sum,
+    gather_lists,
+    get_rank,
+    get_world_size,
+    is_distributed,
+    is_main_process,
+)
+from src.utils import metrics
 from src.utils.utils import eval_rouge
 
+OPTIMIZERS = ["default", "foreach", "fused"]
 
-def train_model(model, train_loader, val_loader, epochs=5, dataset_name="xsum"):
-    optimizer = AdamW(model.parameters(), lr=5e-5)
-    num_training_steps = len(train_loader) * epochs
+
+def build_optimizer(model, lr=5e-5, optimizer_impl="default"):
+    if optimizer_impl not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer {optimizer_impl!r}")
+    device = next(model.parameters()).device
+    if optimizer_impl == "fused" and device.type == "cpu" and torch.__version__ < "2.4":
+        raise ValueError(
+            f"Fused AdamW on CPU needs torch>=2.4, found {torch.__version__}; "
+            "use --optimizer foreach"
+        )
+    options = {"foreach": {"foreach": True}, "fused": {"fused": True}}
+    return AdamW(model.parameters(), lr=lr, **options.get(optimizer_impl, {}))
+
+
+def peak_memory_mb(device):
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / 2**20
+    if device.type == "mps":
+        return torch.mps.driver_allocated_memory() / 2**20
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def log(message):
+    if is_main_process():
+        print(message)
+
+
+def set_epoch(loader, epoch):
+    # Streaming datasets reshuffle themselves, samplers do it otherwise.
+    for source in [loader.sampler, loader.batch_sampler, loader.dataset]:
+        if hasattr(source, "set_epoch"):
+            source.set_epoch(epoch)
+
+
+def rng_state():
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+
+
+def skip_batches(loader, skip):
+    """Continue an epoch after ``skip`` batches without loading them.
+
+    The batch sampler is replayed for the current epoch and only the
+    remaining index lists are kept, so skipped samples are never read.
+    """
+    if skip == 0:
+        return loader
+    if isinstance(loader.dataset, IterableDataset):
+        # A stream cannot seek, so the seen batches are read and dropped.
+        return islice(loader, skip, None)
+    # The original loader drew its worker seed from the global RNG before
+    # the checkpoint was taken; a private generator keeps the restored
+    # global RNG stream (and so dropout) identical.
+    return DataLoader(
+        loader.dataset,
+        batch_sampler=list(islice(loader.batch_sampler, skip, None)),
+        collate_fn=loader.collate_fn,
+        num_workers=loader.num_workers,
+        generator=torch.Generator().manual_seed(skip),
+    )
+
+
+def training_step(forward, batch, device, grad_accum_steps=1, bf16=False):
+    """Forward and backward one micro-batch; returns the unscaled loss."""
+    inputs = {k: v.to(device) for k, v in batch.items()}
+    with torch.autocast(device.type, dtype=torch.bfloat16, enabled=bf16):
+        loss = forward(**inputs).loss
+    (loss / grad_accum_steps).backward()
+    return loss.item()
+
+
+def train_model(
+    model,
+    train_loader,
+    val_loader,
+    epochs=5,
+    dataset_name="xsum",
+    eval_batches=None,
+    grad_accum_steps=1,
+    bf16=False,
+    compile_model=False,
+    gradient_checkpointing=False,
+    optimizer_impl="default",
+    checkpoint_dir=None,
+    checkpoint_every=None,
+    keep_checkpoints=3,
+    resume_from=None,
+    profile_start=10,
+    profile_steps=0,
+):
+    if gradient_checkpointing:
+        # Non-reentrant checkpointing also works under DistributedDataParallel.
+        model.model.gradient_checkpointing_enable(
+            gradient_checkpointing_kwargs={"use_reentrant": False}
+        )
+    ddp = DistributedDataParallel(model) if is_distributed() else None
+    forward = model if ddp is None else ddp
+    forward = torch.compile(forward) if compile_model else forward
+    world_size = get_world_size()
+
+    optimizer = build_optimizer(model, optimizer_impl=optimizer_impl)
+    steps_per_epoch = math.ceil(len(train_loader) / grad_accum_steps)
+    num_training_steps = steps_per_epoch * epochs
     lr_scheduler = get_scheduler(
         "linear",
         optimizer=optimizer,
         num_warmup_steps=500,
         num_training_steps=num_training_steps,
     )
-    history = {"epochs": [], "train_loss": [], "rouge1": [], "rouge2": [], "rougeL": []}
+    history = {
+        "epochs": [],
+        "train_loss": [],
+        "rouge1": [],
+        "rouge2": [],
+        "rougeL": [],
+        "samples_per_sec": [],
+        "peak_memory_mb": [],
+    }
+
+    checkpoints = None
+    if checkpoint_dir is not None:
+        checkpoints = CheckpointManager(checkpoint_dir, keep_last=keep_checkpoints)
+    exports = CheckpointManager(
+        "models",
+        keep_last=1,
+        pattern=f"{dataset_name}_epoch_{{step}}.pth",
+        index_name=f"{dataset_name}_index.json",
+    )
+
+    start_epoch, batches_done, global_step = 0, 0, 0
+    totals = {"loss": 0.0, "samples": 0, "seconds": 0.0}
+    if resume_from is not None:
+        state = torch.load(resume_from, map_location="cpu", weights_only=False)
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        lr_scheduler.load_state_dict(state["scheduler"])
+        history = state["history"]
+        start_epoch = state["epoch"]
+        batches_done = state["batches_done"]
+        global_step = state["global_step"]
+        totals = state["totals"]
+        rng = state["rng"]
+        set_rng_state(rng[get_rank() % len(rng)])
+        log(
+            f"↩️ Resuming from {resume_from}: epoch {start_epoch+1}, "
+            f"batch {batches_done}, step {global_step}"
+        )
 
-    for epoch in range(epochs):
+    def training_state(epoch, batches_done, totals):
+        # Every rank contributes its RNG state so dropout replays exactly.
+        return {
+            "model": model.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "scheduler": lr_scheduler.state_dict(),
+            "history": history,
+            "epoch": epoch,
+            "batches_done": batches_done,
+            "global_step": global_step,
+            "totals": totals,
+            "rng": gather_lists([rng_state()]),
+        }
+
+    profiler = metrics.profile_window(
+        profile_start,
+        profile_steps,
+        f"results/{dataset_name}_trace_rank{get_rank()}.json",
+    )
+    profiler.start()
+    for epoch in range(start_epoch, epochs):
         model.train()
-        total_loss = 0
-        progress_bar = tqdm(train_loader, desc=f"Epoch {epoch+1}/{epochs}")
+        set_epoch(train_loader, epoch)
+        progress_bar = tqdm(
+            skip_batches(train_loader, batches_done),
+            desc=f"Epoch {epoch+1}/{epochs}",
+            initial=batches_done,
+            total=len(train_loader),
+            disable=not is_main_process(),
+        )
 
-        for batch in progress_bar:
-            optimizer.zero_grad()
-            inputs = {k: v.to(model.device) for k, v in batch.items()}
+        total_loss, samples = totals["loss"], totals["samples"]
+        start = time.perf_counter() - totals["seconds"]
 
-            loss = model(**inputs).loss
-            loss.backward()
-            optimizer.step()
-            lr_scheduler.step()
+        optimizer.zero_grad()
+        fetch_start = time.perf_counter()
+        for step, batch in enumerate(progress_bar, start=batches_done):
+            step_start = time.perf_counter()
+            metrics.observe("train_data_wait_seconds", step_start - fetch_start)
+            update = (step + 1) % grad_accum_steps == 0 or step + 1 == len(train_loader)
+            # Gradients are only all-reduced on the micro-batch that steps.
+            sync = nullcontext() if update or ddp is None else ddp.no_sync()
+            with sync, metrics.timer("train_forward_backward_seconds"):
+                current_loss = training_step(
+                    forward, batch, model.device, grad_accum_steps, bf16
+                )
+            if update:
+                with metrics.timer("train_optimizer_seconds"):
+                    optimizer.step()
+                    lr_scheduler.step()
+                    optimizer.zero_grad()
+                global_step += 1
 
-            current_loss = loss.item()
             total_loss += current_loss
+            samples += batch["input_ids"].size(0)
             progress_bar.set_postfix({"loss": f"{current_loss:.3f}"})
+            profiler.step()
+
+            if metrics.enabled():
+                tokens = int(batch["attention_mask"].sum())
+                metrics.inc("train_samples_total", batch["input_ids"].size(0))
+                metrics.inc("train_tokens_total", tokens)
+                metrics.observe(
+                    "train_tokens_per_second",
+                    tokens / (time.perf_counter() - step_start),
+                )
 
-        print("Evaluating...")
-        avg_loss = total_loss / len(train_loader)
+            # Mid-epoch checkpoints land on update boundaries so no partial
+            # gradients need saving; the end of the epoch is saved below.
+            if (
+                checkpoints is not None
+                and checkpoint_every
+                and update
+                and global_step % checkpoint_every == 0
+                and step + 1 < len(train_loader)
+            ):
+                running = {
+                    "loss": total_loss,
+                    "samples": samples,
+                    "seconds": time.perf_counter() - start,
+                }
+                state = training_state(epoch, step + 1, running)
+                if is_main_process():
+                    checkpoints.save(state, global_step)
+            fetch_start = time.perf_counter()
+
+        batches_done = 0
+        totals = {"loss": 0.0, "samples": 0, "seconds": 0.0}
+        elapsed = time.perf_counter() - start
+        samples_per_sec = all_reduce_sum(samples) / elapsed
+        peak_memory = all_reduce_sum(peak_memory_mb(model.device))
+        avg_loss = all_reduce_sum(total_loss / len(train_loader)) / world_size
+        log(f"⚡ {samples_per_sec:.1f} samples/s, peak memory {peak_memory:.0f} MB")
+
+        log("Evaluating...")
         progress_bar.set_description(f"Evaluating epoch {epoch+1}")
-        rouge_scores = eval_rouge(model, val_loader)
+        # Intermediate epochs score a fixed subsample; the last one scores all.
+        # Ranks split the subsample between them.
+        max_batches = None
+        if epoch + 1 < epochs and eval_batches is not None:
+            max_batches = math.ceil(eval_batches / world_size)
+        os.makedirs("results", exist_ok=True)
+        rouge_scores = eval_rouge(
+            model,
+            val_loader,
+            max_batches=max_batches,
+            output_path=f"results/{dataset_name}_eval_epoch_{epoch+1}.jsonl",
+        )
 
         history["epochs"].append(epoch + 1)
         history["train_loss"].append(avg_loss)
         history["rouge1"].append(rouge_scores["rouge1"])
         history["rouge2"].append(rouge_scores["rouge2"])
         history["rougeL"].append(rouge_scores["rougeL"])
+        history["samples_per_sec"].append(samples_per_sec)
+        history["peak_memory_mb"].append(peak_memory)
 
-        print(
+        log(
             f"Epoch {epoch+1}: Loss {avg_loss:.3f}, ROUGE-1{rouge_scores['rouge1']:.3f}"
         )
 
-        # Save checkpoint
-        os.makedirs("models", exist_ok=True)
-        torch.save(model.state_dict(), f"models/{dataset_name}_epoch_{epoch+1}.pth")
+        # Save checkpoint. Only full-set scores compete for "best": a
+        # subsample score is not comparable with the final full evaluation.
+        metric = rouge_scores["rougeL"] if max_batches is None else None
+        state = None
+        if checkpoints is not None:
+            state = training_state(epoch + 1, 0, totals)
+        if is_main_process():
+            if state is not None:
+                checkpoints.save(state, global_step, metric)
+            exports.save(model.state_dict(), epoch + 1, metric)
+
+    profiler.stop()
 
     # Save history
-    os.makedirs("results", exist_ok=True)
-    with open(
-        f"results/{dataset_name}_training_history.json", "w", encoding="utf-8"
-    ) as file_handle:
-        json.dump(history, file_handle, indent=2)
+    if is_main_process():
+        exports.wait()
+        if checkpoints is not None:
+            checkpoints.wait()
+        os.makedirs("results", exist_ok=True)
+        with open(
+            f"results/{dataset_name}_training_history.json", "w", encoding="utf-8"
+        ) as file_handle:
+            json.dump(history, file_handle, indent=2)
+        if metrics.enabled():
+            metrics.registry.dump(f"results/{dataset_name}_metrics.json")
 
     return model, history
@@ -0,0 +1,218 @@
+import json
+import math
+import os
+import threading
+import time
+
+import torch
+
+ENV_VAR = "SUMMARIZER_METRICS"
+
+# Upper bounds in seconds (or tokens/sec for throughput histograms).
+BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    100,
+    1000,
+    10000,
+    math.inf,
+)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    """Process-wide counters and histograms.
+
+    Every entry point checks ``enabled`` first, so a disabled registry costs
+    one attribute lookup per call and never touches the lock.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    def timer(self, name):
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: {
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "mean": histogram.sum / max(histogram.count, 1),
+                        "buckets": dict(
+                            zip(map(str, histogram.buckets), histogram.counts)
+                        ),
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def to_prometheus(self, prefix="summarizer_"):
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                lines.append(f"{prefix}{name} {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    label = "+Inf" if bound == math.inf else bound
+                    bucket = f'{prefix}{name}_bucket{{le="{label}"}}'
+                    lines.append(f"{bucket} {cumulative}")
+                lines.append(f"{prefix}{name}_sum {histogram.sum}")
+                lines.append(f"{prefix}{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as file_handle:
+            json.dump(self.to_dict(), file_handle, indent=2)
+
+
+class Timer:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.start = None
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.registry.observe(self.name, self.elapsed)
+
+
+class NullTimer:
+    elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+
+NULL_TIMER = NullTimer()
+
+registry = Registry(enabled=os.environ.get(ENV_VAR, "0") == "1")
+inc = registry.inc
+observe = registry.observe
+timer = registry.timer
+
+
+def enabled():
+    return registry.enabled
+
+
+def enable():
+    # Exported so spawned workers (DDP, process pools) start enabled too.
+    os.environ[ENV_VAR] = "1"
+    registry.enabled = True
+
+
+def instrument(module, name):
+    """Time every forward call of ``module`` into histogram ``name``."""
+    if not registry.enabled:
+        return
+
+    def start(module, args):
+        module.metrics_start = time.perf_counter()
+
+    def stop(module, args, output):
+        observe(name, time.perf_counter() - module.metrics_start)
+
+    module.register_forward_pre_hook(start)
+    module.register_forward_hook(stop)
+
+
+class NullProfiler:
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def step(self):
+        pass
+
+
+def profile_window(start, num_steps, trace_path):
+    """``torch.profiler`` over steps ``[start, start + num_steps)``.
+
+    Call ``start()`` before the loop, ``step()`` after every step and
+    ``stop()`` at the end; the Chrome trace is written to ``trace_path`` as
+    soon as the window closes. A no-op stand-in is returned when
+    ``num_steps`` is falsy.
+    """
+    if not num_steps:
+        return NullProfiler()
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(
+            skip_first=max(start - 1, 0),
+            wait=0,
+            warmup=min(start, 1),
+            active=num_steps,
+            repeat=1,
+        ),
+        on_trace_ready=lambda profiler: profiler.export_chrome_trace(trace_path),
+        record_shapes=True,
+    )
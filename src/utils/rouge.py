@@ -0,0 +1,61 @@
+import argparse
+import json
+
+from rouge_score import rouge_scorer
+
+ROUGE_TYPES = ["rouge1", "rouge2", "rougeL", "rougeLsum"]
+
+
+def score_batch(predictions, references, rouge_types=None, use_stemmer=False):
+    """Per-example ROUGE F-measures."""
+    scorer = rouge_scorer.RougeScorer(
+        rouge_types or ROUGE_TYPES, use_stemmer=use_stemmer
+    )
+    return [
+        {
+            name: score.fmeasure
+            for name, score in scorer.score(reference, prediction).items()
+        }
+        for prediction, reference in zip(predictions, references)
+    ]
+
+
+def aggregate(rows, rouge_types=None):
+    return {
+        name: sum(row[name] for row in rows) / max(len(rows), 1)
+        for name in rouge_types or ROUGE_TYPES
+    }
+
+
+def write_predictions(path, rows):
+    with open(path, "w", encoding="utf-8") as file_handle:
+        for row in rows:
+            file_handle.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def rescore(path, rouge_types=None, use_stemmer=False):
+    """Score saved predictions again without regenerating them."""
+    with open(path, encoding="utf-8") as file_handle:
+        rows = [json.loads(line) for line in file_handle]
+    scores = score_batch(
+        [row["prediction"] for row in rows],
+        [row["reference"] for row in rows],
+        rouge_types,
+        use_stemmer,
+    )
+    return aggregate(scores, rouge_types)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score saved predictions")
+    parser.add_argument("predictions", help="*_eval_epoch_N.jsonl file")
+    parser.add_argument("--rouge-types", nargs="+", default=ROUGE_TYPES)
+    parser.add_argument("--stemmer", action="store_true")
+    args = parser.parse_args()
+
+    scores = rescore(args.predictions, args.rouge_types, args.stemmer)
+    print(json.dumps(scores, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,43 @@
+import functools
+import itertools
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import evaluate
 import matplotlib.pyplot as plt
 import torch
 
-rouge = evaluate.load("rouge")
+from src.train.distributed import gather_lists, is_main_process
+from src.utils.rouge import aggregate, score_batch, write_predictions
+
+
+@functools.lru_cache(maxsize=None)
+def _rouge():
+    # Loaded on first use: evaluate.load fetches the metric from the Hub,
+    # which importing this module (e.g. from the offline bench) must not do.
+    return evaluate.load("rouge")
 
 
 def compute_rouge(predictions, references):
-    return rouge.compute(predictions=predictions, references=references)
+    return _rouge().compute(predictions=predictions, references=references)
 
 
-def eval_rouge(model, val_loader):
+def eval_rouge(model, val_loader, max_batches=None, output_path=None):
+    """Generate summaries for ``val_loader`` and score them with ROUGE.
+
+    Scoring runs on a background thread while the next batches are
+    generated; it is cheap next to generation and, unlike a spawned process
+    pool, needs no worker to re-import the training entry point.
+    ``max_batches`` limits evaluation to a fixed leading subsample, and
+    ``output_path`` keeps per-example predictions and scores as JSONL so
+    they can be re-scored later with ``src.utils.rouge``.
+    """
     model.eval()
-    predictions, references = [], []
+    scored = []
 
-    with torch.no_grad():
-        for batch in val_loader:
-            print(batch)
+    with torch.no_grad(), ThreadPoolExecutor(max_workers=1) as pool:
+        for batch in itertools.islice(val_loader, max_batches):
             input_ids = batch["input_ids"].to(model.device)
             attention_mask = batch["attention_mask"].to(model.device)
 
@@ -30,14 +49,23 @@ def eval_rouge(model, val_loader):
                 early_stopping=True,
             )
             preds = model.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
-            predictions.extend(preds)
 
             labels = batch["labels"].clone()
             labels[labels == -100] = model.tokenizer.pad_token_id
             refs = model.tokenizer.batch_decode(labels, skip_special_tokens=True)
-            references.extend(refs)
-
-    return rouge.compute(predictions=predictions, references=references)
+            scored.append((preds, refs, pool.submit(score_batch, preds, refs)))
+
+        rows = [
+            {"prediction": pred, "reference": ref, **scores}
+            for preds, refs, future in scored
+            for pred, ref, scores in zip(preds, refs, future.result())
+        ]
+
+    # Under torch.distributed every rank scored its own shard.
+    rows = gather_lists(rows)
+    if output_path and is_main_process():
+        write_predictions(output_path, rows)
+    return aggregate(rows)
 
 
 def plot_training_curves(dataset_name):